@@ -0,0 +1,292 @@
+"""
+Benchmarks for the TaxParams hot paths: importing taxparams, converting the
+defaults, creating an instance, setting the state, and adjusting it with the
+reforms used in taxparams/tests/test.py.
+
+Wall time is the median over --repeat runs. Peak memory is measured with
+tracemalloc in a separate run so that tracing does not affect the timings.
+
+Timings depend on the machine, so no reference results are kept in the
+repository. To check a change for regressions, save the results from before
+the change and compare against them on the same machine with --compare. The
+comparison fails if a scenario is more than --threshold slower or uses more
+than --memory-threshold more peak memory than the saved results.
+
+Usage:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --save before.json
+    python benchmarks/bench.py --compare before.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmark the taxparams package in this checkout, whether or not it is
+# installed.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+YEARS = [2014, 2016, 2018, 2022, 2025]
+
+REFORMS = {
+    "adjust_eitc": {
+        "EITC_c": [
+            {"year": year, "EIC": eic, "value": value + i}
+            for year, value in ((2020, 10000), (2023, 20000))
+            for i, eic in enumerate(["0kids", "1kid", "2kids", "3+kids"])
+        ]
+    },
+    "adjust_eitc_indexed_beginning": {"EITC_c-indexed": False},
+    "adjust_multiple_cpi_swaps": {
+        "II_em": [
+            {"year": 2016, "value": 6000},
+            {"year": 2018, "value": 7500},
+            {"year": 2020, "value": 9000},
+        ],
+        "II_em-indexed": [
+            {"year": 2016, "value": False},
+            {"year": 2018, "value": True},
+        ],
+    },
+    "adjust_multiple_cpi_swaps2": {
+        "SS_Earnings_c": [
+            {"year": 2016, "value": 300000},
+            {"year": 2018, "value": 500000},
+            {"year": 2020, "value": 700000},
+        ],
+        "SS_Earnings_c-indexed": [
+            {"year": 2017, "value": False},
+            {"year": 2019, "value": True},
+        ],
+        "AMT_em-indexed": [
+            {"year": 2017, "value": False},
+            {"year": 2020, "value": True},
+        ],
+        "II_em": [
+            {"year": 2016, "value": 6000},
+            {"year": 2018, "value": 7500},
+            {"year": 2020, "value": 9000},
+        ],
+        "II_em-indexed": [
+            {"year": 2016, "value": False},
+            {"year": 2018, "value": True},
+        ],
+    },
+    "adjust_cpi_offset_ctc_indexed": {
+        "CPI_offset": [{"year": 2020, "value": -0.005}],
+        "CTC_c-indexed": [{"year": 2020, "value": True}],
+    },
+}
+for year in YEARS:
+    REFORMS[f"adjust_eitc_indexed_{year}"] = {
+        "EITC_c-indexed": [{"year": year, "value": False}]
+    }
+    REFORMS[f"adjust_eitc_indexed_and_value_{year}"] = {
+        "EITC_c": [
+            {"year": year, "EIC": eic, "value": 10000 + i}
+            for i, eic in enumerate(["0kids", "1kid", "2kids", "3+kids"])
+        ],
+        "EITC_c-indexed": [{"year": year, "value": False}],
+    }
+    REFORMS[f"adjust_ctc_activate_index_{year}"] = {
+        "CTC_c": [{"year": year, "value": 1005}],
+        "CTC_c-indexed": [{"year": year, "value": True}],
+    }
+    REFORMS[f"adjust_cpi_offset_{year}"] = {
+        "CPI_offset": [{"year": year, "value": -0.001}]
+    }
+
+
+def time_import(trace=False):
+    """
+    Time importing taxparams in a new interpreter.
+
+    Returns: seconds, or the peak memory in bytes if trace is set.
+    """
+    if trace:
+        code = (
+            "import tracemalloc; tracemalloc.start(); import taxparams; "
+            "print(tracemalloc.get_traced_memory()[1])"
+        )
+    else:
+        code = (
+            "import time; start = time.perf_counter(); import taxparams; "
+            "print(time.perf_counter() - start)"
+        )
+    # python -c imports from the current directory first.
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    return float(out.stdout.strip())
+
+
+def scenarios():
+    """
+    Returns: dict of {name: (setup, func)}. setup is called before each run
+    of func and its return value is passed to func.
+    """
+    from taxparams import TaxParams, utils
+
+    # Build the defaults cache and the baseline outside of the timings.
+    TaxParams.from_baseline()
+    cache_dir = tempfile.TemporaryDirectory()
+    utils.load_defaults(cache_dir=cache_dir.name)
+
+    result = {
+        # policy_current_law.json is parsed again on each run.
+        "convert_defaults": (
+            lambda: utils.__dict__.pop("DEFAULTS", None),
+            lambda _: utils.convert_defaults(),
+        ),
+        "load_defaults": (
+            lambda: None,
+            lambda _: utils.load_defaults(cache_dir=cache_dir.name),
+        ),
+        "init": (lambda: None, lambda _: TaxParams()),
+        "from_baseline": (lambda: None, lambda _: TaxParams.from_baseline()),
+        "set_state": (
+            TaxParams.from_baseline,
+            lambda taxparams: taxparams.set_state(year=2025),
+        ),
+    }
+    for name, reform in REFORMS.items():
+        result[name] = (
+            TaxParams.from_baseline,
+            lambda taxparams, reform=reform: taxparams.adjust(reform),
+        )
+    return result
+
+
+def run(repeat, select=None):
+    results = {}
+    if select is None or "import" in select:
+        times = [time_import() for _ in range(repeat)]
+        results["import"] = {
+            "time": statistics.median(times),
+            "peak_mb": time_import(trace=True) / 1024 ** 2,
+        }
+        print(
+            f"{'import':36} {results['import']['time'] * 1000:10.1f} ms"
+            f" {results['import']['peak_mb']:8.1f} MB",
+            file=sys.stderr,
+        )
+    for name, (setup, func) in scenarios().items():
+        if select is not None and name not in select:
+            continue
+        times = []
+        for _ in range(repeat):
+            arg = setup()
+            start = time.perf_counter()
+            func(arg)
+            times.append(time.perf_counter() - start)
+        arg = setup()
+        tracemalloc.start()
+        func(arg)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {
+            "time": statistics.median(times),
+            "peak_mb": peak / 1024 ** 2,
+        }
+        print(
+            f"{name:36} {results[name]['time'] * 1000:10.1f} ms"
+            f" {results[name]['peak_mb']:8.1f} MB",
+            file=sys.stderr,
+        )
+    return results
+
+
+def compare(results, baseline, threshold, memory_threshold):
+    """
+    Returns: names of the scenarios that are more than threshold slower or
+    use more than memory_threshold more peak memory than in baseline.
+    Peak memory below 1 MB is compared as if it were 1 MB.
+    """
+    regressed = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:36} not in the reference results")
+            continue
+        ratio = result["time"] / baseline[name]["time"]
+        status = []
+        if ratio > 1 + threshold:
+            status.append("SLOWER")
+        memory = ""
+        base_mb = baseline[name].get("peak_mb")
+        if result["peak_mb"] is not None and base_mb:
+            memory = f" {result['peak_mb'] / base_mb:6.2f}x memory"
+            # Scenarios that use less than 1 MB are compared to 1 MB so
+            # that small absolute changes are not reported.
+            if result["peak_mb"] - base_mb > memory_threshold * max(base_mb, 1):
+                status.append("MORE MEMORY")
+        print(f"{name:36} {ratio:6.2f}x time{memory} {' '.join(status) or 'ok'}")
+        if status:
+            regressed.append(name)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--select", nargs="*", help="Only run these scenarios."
+    )
+    parser.add_argument("--save", help="Write the results to this file.")
+    parser.add_argument(
+        "--compare",
+        metavar="PATH",
+        help="Compare the results to those saved in this file with --save.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Fail if a scenario is this much slower than in --compare.",
+    )
+    parser.add_argument(
+        "--memory-threshold",
+        type=float,
+        default=0.25,
+        help="Fail if a scenario uses this much more peak memory than in "
+        "--compare.",
+    )
+    args = parser.parse_args(argv)
+
+    # Read the saved results first in case --save overwrites them.
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    results = run(args.repeat, args.select)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.platform(),
+                    "results": results,
+                },
+                f,
+                indent=4,
+            )
+    if baseline is not None:
+        regressed = compare(
+            results, baseline, args.threshold, args.memory_threshold
+        )
+        if regressed:
+            sys.exit(f"Regressed from {args.compare}: {', '.join(regressed)}")
+
+
+if __name__ == "__main__":
+    main()
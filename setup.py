@@ -16,8 +16,14 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/hdoupe/TaxParams",
     packages=setuptools.find_packages(),
-    install_requires=["paramtools"],
+    install_requires=["paramtools>=0.12.0,<0.13"],
     include_package_data=True,
+    entry_points={
+        "console_scripts": [
+            "taxparams=taxparams.cli:main",
+            "taxparams-server=taxparams.server:main",
+        ],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
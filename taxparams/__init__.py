@@ -1,12 +1,29 @@
+from collections import defaultdict, OrderedDict
+import threading
+
 import paramtools as pt
-from paramtools.select import select_lt
-import taxcalc
+from paramtools.exceptions import (
+    collision_list,
+    ParameterNameCollisionException,
+)
+from paramtools.schema_factory import SchemaFactory
 import numpy as np
 import marshmallow as ma
 import copy
 
 
-from taxparams import utils
+from taxparams import parallel, sweep, utils
+from taxparams.cache import ReformCache, reform_fingerprint
+from taxparams.checkpoint import Checkpoint
+from taxparams.delta import BaselineDelta, diff
+from taxparams.indexing import extend_values, source_index
+from taxparams.results import ResultFile, save_results
+from taxparams.search import YearIndex
+from taxparams.shm import SharedArrays
+from taxparams.stats import AdjustStats, NULL_STATS
+from taxparams.store import ValueStore
+from taxparams.validation import CompiledValidator
+from taxparams.views import YearView
 
 
 class CompatibleDataSchema(ma.Schema):
@@ -27,26 +44,413 @@ pt.register_custom_type(
 )
 
 
+class LazyDefaults:
+    """
+    Class attribute that loads the converted taxcalc defaults on first
+    access instead of when taxparams is imported.
+    """
+
+    def __init__(self):
+        self.value = None
+        self.lock = threading.Lock()
+
+    def __get__(self, obj, cls):
+        if self.value is None:
+            with self.lock:
+                if self.value is None:
+                    self.value = utils.load_defaults()
+        return self.value
+
+
 class TaxParams(pt.Parameters):
-    defaults = utils.convert_defaults()
+    defaults = LazyDefaults()
     array_first = True
     label_to_extend = "year"
     uses_extend_func = True
 
     WAGE_INDEXED_PARAMS = ("SS_Earnings_c", "SS_Earnings_thd")
 
+    # Set to True to build parameter attributes when they are first accessed
+    # instead of building them for all parameters whenever the state or the
+    # values change.
+    lazy_arrays = False
+
+    # Set to a ReformCache to cache the results of adjust.
+    reform_cache = None
+
+    # Set to False to create instances with paramtools.Parameters.__init__,
+    # which deserializes and validates the default value objects one by one.
+    fast_defaults = True
+
+    # Set to False to validate every adjustment with the ParamTools
+    # validator schema, one value object at a time. See CompiledValidator.
+    compiled_validation = True
+
+    # Set collect_adjust_stats to True to record an AdjustStats for each call
+    # to adjust in adjust_stats. Each function in adjust_stats_callbacks is
+    # called with the AdjustStats when adjust returns or raises.
+    collect_adjust_stats = False
+    adjust_stats_callbacks = ()
+    adjust_stats = None
+
+    _baseline_lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):
         self._wage_growth_rates = None
         self._inflation_rates = None
         self._gfactors = None
         self._wage_indexed = TaxParams.WAGE_INDEXED_PARAMS
-        super().__init__(*args, **kwargs)
+        self._shared_values = set([])
+        self._year_indexes = {}
+        self._stacked = {}
+        self._reform_fingerprint = None
+        self._active_stats = NULL_STATS
+        if self.fast_defaults:
+            self._init_parameters(*args, **kwargs)
+        else:
+            super().__init__(*args, **kwargs)
+        self._validator_schema = CompiledValidator(self._validator_schema)
+        # Fingerprint of the adjustments made since the defaults were
+        # loaded. It is None if the values have been modified in a way that
+        # the reform cache does not track.
+        self._reform_fingerprint = ""
         self._init_values = {
             param: data["value"]
             for param, data in self.read_params(self.defaults).items()
             if param != "schema"
         }
 
+    def _init_parameters(
+        self,
+        initial_state=None,
+        array_first=False,
+        label_to_extend=None,
+        uses_extend_func=False,
+        index_rates=None,
+    ):
+        """
+        Faster version of paramtools.Parameters.__init__. The schemas and
+        the metadata of each parameter are loaded by ParamTools, but the
+        value objects are not deserialized one by one. Their values are
+        cast to the parameter's type with NumPy and they are extended to
+        all years in one pass, without being validated again.
+        """
+        defaults = pt.utils.read_json(self.defaults)
+        metadata = {
+            param: dict(data, value=[]) if param != "schema" else data
+            for param, data in defaults.items()
+        }
+        schemafactory = SchemaFactory(metadata)
+        (
+            self._defaults_schema,
+            self._validator_schema,
+            self._schema,
+            self._data,
+        ) = schemafactory.schemas()
+        for param, data in self._data.items():
+            data["value"] = utils.typed_value_objects(
+                defaults[param]["value"], data["type"]
+            )
+        self.label_validators = schemafactory.label_validators
+        self._stateless_label_grid = OrderedDict()
+        for name, v in self.label_validators.items():
+            if hasattr(v, "grid"):
+                self._stateless_label_grid[name] = v.grid()
+            else:
+                self._stateless_label_grid[name] = []
+        self.label_grid = copy.deepcopy(self._stateless_label_grid)
+        self._validator_schema.context["spec"] = self
+        self._warnings = {}
+        self._errors = {}
+        self._state = initial_state or {}
+        self._search_trees = {}
+        self.index_rates = index_rates or self.index_rates
+
+        ops = [
+            ("array_first", array_first, False),
+            ("label_to_extend", label_to_extend, None),
+            ("uses_extend_func", uses_extend_func, False),
+        ]
+        schema_ops = self._schema.get("operators", {})
+        for name, init_value, default in ops:
+            user_vals = [init_value, getattr(self, name), schema_ops.get(name)]
+            for value in user_vals:
+                if value != default and value is not None:
+                    setattr(self, name, value)
+                    break
+
+        if self.label_to_extend == "year" and self._extends_with_numpy():
+            self.set_rates()
+            extend_grid = self._stateless_label_grid["year"]
+            for param, vos in self._extension(self._data, extend_grid).items():
+                self._update_param(param, vos)
+            self.set_state()
+        elif self.label_to_extend:
+            prev_array_first = self.array_first
+            self.array_first = False
+            self.set_state()
+            self.extend()
+            if prev_array_first:
+                self.array_first = True
+                self.set_state()
+        else:
+            self.set_state()
+
+        if "operators" not in self._schema:
+            self._schema["operators"] = {}
+        self._schema["operators"].update(self.operators)
+
+    @classmethod
+    def from_baseline(cls):
+        """
+        Return a new instance forked from a baseline instance that is
+        created once per class. This skips parsing and extending the
+        defaults for every instance after the first one.
+
+        Returns: new instance with default values.
+        """
+        baseline = cls.__dict__.get("_baseline")
+        if baseline is None:
+            with cls._baseline_lock:
+                baseline = cls.__dict__.get("_baseline")
+                if baseline is None:
+                    baseline = cls()
+                    cls._baseline = baseline
+        return baseline.fork()
+
+    @classmethod
+    def adjust_many(cls, reforms, workers=None, **kwargs):
+        """
+        Adjust forks of the baseline instance with each reform in reforms in
+        a pool of worker processes. Each worker builds the baseline once.
+        Workers only send back the parameters that differ from the baseline.
+
+        Arguments:
+            reforms: iterable of dicts of adjustments. File paths and JSON
+                strings are not read. See parallel.check_reform.
+            workers: number of worker processes. Defaults to the number of
+                CPUs. Reforms are adjusted in this process if workers is 1.
+            kwargs: passed to adjust.
+
+        Returns: list of adjusted instances, or paramtools.ValidationErrors
+            for reforms that are not valid, in the same order as reforms.
+        """
+        return parallel.adjust_many(cls, reforms, workers=workers, **kwargs)
+
+    @classmethod
+    def share_baseline(cls):
+        """
+        Copy the stacked arrays of the baseline instance to shared memory.
+        Instances of cls that are pickled afterwards refer to the block of
+        shared memory, and so do the workers of adjust_many. Processes that
+        unpickle them use the shared arrays for their baseline instead of
+        building them.
+
+        Only the stacked arrays are shared. A process that does not have a
+        baseline instance yet still builds one, with its schemas, value
+        objects, and attributes, before it attaches to the shared arrays.
+        Workers that are forked from the process that built the baseline
+        inherit it instead. The saving is the memory of the stacked arrays
+        in each process, not the cost of building the baseline.
+
+        Returns: SharedArrays. Call its unlink method when the other
+            processes are done with it.
+        """
+        baseline = cls.__dict__.get("_baseline")
+        if baseline is None:
+            cls.from_baseline()
+            baseline = cls._baseline
+        arrays = {}
+        for param in baseline._data:
+            arr, _ = baseline._stacked_array(param)
+            if isinstance(arr, np.ndarray):
+                arrays[param] = arr
+        shared = SharedArrays.create(arrays)
+        cls._attach_shared_baseline(shared)
+        return shared
+
+    @classmethod
+    def _attach_shared_baseline(cls, shared):
+        """
+        Use the arrays in shared as the stacked arrays of the baseline
+        instance. Forks of the baseline share them until they modify a
+        parameter.
+        """
+        if cls.__dict__.get("_shared_baseline") is not None and (
+            cls._shared_baseline.name == shared.name
+        ):
+            return
+        cls.from_baseline()
+        baseline = cls._baseline
+        for param, arr in shared.arrays().items():
+            vos = baseline._data[param]["value"]
+            baseline._stacked[param] = (arr, bool(vos) and "year" in vos[0])
+        cls._shared_baseline = shared
+
+    def fork(self):
+        """
+        Create an independent copy of this instance without re-parsing the
+        defaults. The value objects are shared by both instances until one
+        of them modifies a parameter. The copy is made at that point, see
+        _update_param.
+
+        Returns: new instance with the same values, state, and rates.
+        """
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new._data = type(self._data)(
+            (param, dict(data, value=list(data["value"])))
+            for param, data in self._data.items()
+        )
+        self._shared_values = set(self._data)
+        new._shared_values = set(self._data)
+        new._search_trees = {}
+        new._year_indexes = {}
+        # Stacked arrays are read-only and can be shared.
+        new._stacked = dict(self._stacked)
+
+        new._validator_schema = copy.copy(self._validator_schema)
+        new._validator_schema.context = {"spec": new}
+
+        new.label_grid = copy.deepcopy(self.label_grid)
+        new._state = copy.deepcopy(self._state)
+        new._errors = copy.deepcopy(self._errors)
+        new._warnings = copy.deepcopy(self._warnings)
+        new._inflation_rates = copy.copy(self._inflation_rates)
+        new._wage_growth_rates = copy.copy(self._wage_growth_rates)
+        for param in self._data:
+            if param in self.__dict__:
+                setattr(new, param, copy.copy(self.__dict__[param]))
+        return new
+
+    def cpi_offset_sweep(self, scenarios, **kwargs):
+        """
+        Compute the values of the indexed parameters after adjusting this
+        instance with each of many CPI_offset adjustments. This instance is
+        not modified. See sweep.cpi_offset_sweep.
+
+        Arguments:
+            scenarios: list of CPI_offset adjustments, i.e. lists of value
+                objects.
+            kwargs: passed to adjust.
+
+        Returns: dict of {param: array} for CPI_offset and the indexed
+            parameters. Each array has the shape of the parameter's
+            stacked_array with a leading scenario dimension.
+        """
+        return sweep.cpi_offset_sweep(self, scenarios, **kwargs)
+
+    def __getstate__(self):
+        """
+        Pickle only what can not be rebuilt from the baseline instance: the
+        parameters that differ from it, the rates, and the state. The
+        schemas, validators, and growth factors are not pickled.
+        """
+        cls = type(self)
+        baseline = cls.__dict__.get("_baseline")
+        if baseline is None:
+            params = list(self._data)
+        else:
+            params = self._diff_params(baseline)
+        state = {
+            "snapshot": self._snapshot(params=params),
+            "state": self._state,
+            "label_grid": self.label_grid,
+            "errors": self._errors,
+            "fingerprint": self._reform_fingerprint,
+            "operators": {
+                name: self.__dict__[name]
+                for name in self.operators
+                if name in self.__dict__
+            },
+            "attrs": None,
+            "shared_baseline": cls.__dict__.get("_shared_baseline"),
+        }
+        if self._state:
+            # The attributes of the baseline instance are for all years.
+            state["attrs"] = {
+                param: self.__dict__[param]
+                for param in self._data
+                if param in self.__dict__
+            }
+        return state
+
+    def __setstate__(self, state):
+        """
+        Fork the baseline instance, which is built if this process does not
+        have it yet, and restore the pickled parameters on top of it.
+        """
+        cls = type(self)
+        if state["shared_baseline"] is not None:
+            cls._attach_shared_baseline(state["shared_baseline"])
+        self.__dict__.update(cls.from_baseline().__dict__)
+        self._validator_schema.context = {"spec": self}
+        self.__dict__.update(state["operators"])
+        self._restore(state["snapshot"])
+        self._errors = state["errors"]
+        self._reform_fingerprint = state["fingerprint"]
+        if state["attrs"] is not None:
+            self._state = state["state"]
+            self.label_grid = state["label_grid"]
+            for param in self._data:
+                if param in state["attrs"]:
+                    setattr(self, param, state["attrs"][param])
+                else:
+                    self.__dict__.pop(param, None)
+
+    def checkpoint(self):
+        """
+        Save the parameter values, their indexed status, and the indexing
+        rates so that they can be restored with rollback. No value objects
+        are copied: they are shared with the checkpoint until this instance
+        modifies them.
+
+        Returns: Checkpoint that can be passed to rollback.
+        """
+        self._shared_values = set(self._data)
+        return Checkpoint(self)
+
+    def rollback(self, checkpoint):
+        """
+        Restore the parameter values, their indexed status, and the indexing
+        rates saved by checkpoint. Only the parameters that were modified
+        after the checkpoint was created are restored. Their attributes are
+        restored too or, if the state has changed since then, rebuilt.
+
+        Raises:
+            ValueError if the checkpoint was created by another instance.
+        """
+        if checkpoint.owner is not self:
+            raise ValueError("checkpoint was created by another instance.")
+        changed = checkpoint.changed_params()
+        for param in changed:
+            self._data[param]["value"] = checkpoint.values[param]
+            if checkpoint.indexed[param] is None:
+                self._data[param].pop("indexed", None)
+            else:
+                self._data[param]["indexed"] = checkpoint.indexed[param]
+            self._search_trees.pop(param, None)
+            self._year_indexes.pop(param, None)
+            if param in checkpoint.stacked:
+                self._stacked[param] = checkpoint.stacked[param]
+            else:
+                self._stacked.pop(param, None)
+        # The restored value objects are shared with the checkpoint again.
+        self._shared_values |= set(changed)
+        self._inflation_rates = copy.copy(checkpoint.inflation_rates)
+        self._wage_growth_rates = checkpoint.wage_growth_rates
+        self._warnings = copy.deepcopy(checkpoint.warnings)
+        self._errors = copy.deepcopy(checkpoint.errors)
+        self._reform_fingerprint = checkpoint.fingerprint
+        if self._state == checkpoint.state:
+            for param in changed:
+                if param in checkpoint.attrs:
+                    setattr(self, param, checkpoint.attrs[param])
+                else:
+                    self.__dict__.pop(param, None)
+        elif changed:
+            self._set_state(params=changed)
+
     def adjust(self, params_or_path, **kwargs):
         """
         Custom adjust method that handles special indexing logic. The logic
@@ -62,6 +466,9 @@ class TaxParams(pt.Parameters):
             is extrapolated through the budget window. If there are indexed
             parameters in the adjustment, they will be included in the final
             adjustment call (unless their indexed status is changed).
+            The 'unknown' values are re-extended in place instead of being
+            deleted, and only the values that change are updated and
+            validated. See _reextend.
         2. If the "indexed" status is updated for any parameter:
             a. If a parameter has values that are being adjusted before
                 the indexed status is adjusted, update those parameters first.
@@ -78,6 +485,11 @@ class TaxParams(pt.Parameters):
         4. Return parsed adjustment with all adjustments, including "-indexed"
             parameters.
 
+        If reform_cache is set, the resulting state is cached by the
+        fingerprint of the adjustment and of the adjustments that were made
+        before it. Adjusting an instance with the same reform again restores
+        the cached state instead of repeating the steps above.
+
         Notable side-effects:
             - All values of indexed parameters, including default values, are
                 wiped out after the first year in which the "CPI_offset" is
@@ -89,22 +501,81 @@ class TaxParams(pt.Parameters):
               wiped out after the year in which the value is adjusted for the
               same hard-coding reason.
         """
+        stats = NULL_STATS
+        if self.collect_adjust_stats or self.adjust_stats_callbacks:
+            stats = AdjustStats()
+        self._active_stats = stats
+        error = None
+        try:
+            return self._adjust_indexed(params_or_path, stats, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._active_stats = NULL_STATS
+            if stats is not NULL_STATS:
+                stats.stop(error)
+                self.adjust_stats = stats
+                self._run_stats_callbacks(stats, error)
+
+    def _run_stats_callbacks(self, stats, error):
+        """
+        Call each function in adjust_stats_callbacks with stats. A callback
+        that raises does not stop the others from being called. If adjust
+        raised error, exceptions from callbacks are dropped so that error is
+        the one that propagates. Otherwise, the first one is raised after
+        all callbacks have been called.
+        """
+        callback_error = None
+        for callback in self.adjust_stats_callbacks:
+            try:
+                callback(stats)
+            except Exception as e:
+                if callback_error is None:
+                    callback_error = e
+        if callback_error is not None and error is None:
+            raise callback_error
+
+    def _adjust_indexed(self, params_or_path, stats, **kwargs):
+        """
+        Implementation of adjust. The time spent in each step and the work
+        done are recorded in stats.
+        """
         min_year = min(self._stateless_label_grid["year"])
 
+        stats.phase("read_params")
+        params = self.read_params(params_or_path)
+        self._validate_value_objects(params)
+        params = self._validate_indexed_params(params)
+        cache_key = self._reform_cache_key(params, kwargs)
+        if cache_key is not None:
+            stats.phase("reform_cache")
+            cached = self.reform_cache.get(cache_key)
+            if cached is not None:
+                stats.cache_hit = True
+                snapshot, adj = cached
+                self._restore(snapshot)
+                self._reform_fingerprint = cache_key
+                return copy.deepcopy(adj)
+        self._reform_fingerprint = None
+
         # Temporarily turn off extra ops during the intermediary adjustments
         # so that expensive and unnecessary operations are not run.
         label_to_extend = self.label_to_extend
         array_first = self.array_first
         self.array_first = False
 
-        params = self.read_params(params_or_path)
-
         # Check if CPI_offset is adjusted. If so, reset values of all indexed
         # parameters after year where CPI_offset is changed. If CPI_offset is
         # changed multiple times, then reset values after the first year in
         # which the CPI_offset is changed.
         needs_reset = []
         if params.get("CPI_offset") is not None:
+            stats.phase("cpi_offset")
+            # The new CPI_offset values are added to the current rates below,
+            # so compute them from the current values first.
+            if self._inflation_rates is None:
+                self.set_rates()
             # Update CPI_offset with new value.
             cpi_adj = super().adjust(
                 {
@@ -125,24 +596,18 @@ class TaxParams(pt.Parameters):
             for cpi_vo in rate_adjustment_vals:
                 self._inflation_rates[cpi_vo["year"] - self.start_year] += \
                     cpi_vo["value"]
-            # 1. delete all unknown values.
+            # 1. re-extend all unknown values with the new rates.
             # 1.a for revision these are years specified after cpi_min_year
-            to_delete = {}
+            cuts = {}
             for param in params:
                 if param == "CPI_offset" or param in self._wage_indexed:
                     continue
                 if param.endswith("-indexed"):
                     param = param.split("-indexed")[0]
                 if self._data[param].get("indexed", False):
-                    gt = self.select_gt(param, True, year=cpi_min_year["year"])
-                    to_delete[param] = [
-                        dict(vo, **{"value": None}) for vo in gt
-                    ]
-                    needs_reset.append(param)
-            super().adjust(to_delete, **kwargs)
+                    cuts[param] = cpi_min_year["year"]
 
             # 1.b for all others these are years after last_known_year
-            to_delete = {}
             last_known_year = max(cpi_min_year["year"], self._last_known_year)
             for param in self._data:
                 if (
@@ -152,65 +617,37 @@ class TaxParams(pt.Parameters):
                 ):
                     continue
                 if self._data[param].get("indexed", False):
-                    gt = self.select_gt(param, True, year=last_known_year)
-                    to_delete[param] = [
-                        dict(vo, **{"value": None}) for vo in gt
-                    ]
-                    needs_reset.append(param)
+                    cuts.setdefault(param, last_known_year)
 
-            super().adjust(to_delete, **kwargs)
-
-            self.extend(label_to_extend="year")
+            # Only the parameters whose values changed need to be reset.
+            needs_reset.extend(self._reextend(cuts))
 
         # 2. Handle -indexed parameters.
+        stats.phase("indexed")
         self.label_to_extend = None
         index_affected = set([])
         for param, values in params.items():
             if param.endswith("-indexed"):
                 base_param = param.split("-indexed")[0]
-                if not self._data[base_param].get("indexable", None):
-                    msg = f"Parameter {base_param} is not indexable."
-                    raise pt.ValidationError(
-                        {"errors": {base_param: msg}},
-                        labels=None
-                    )
                 index_affected |= {param, base_param}
                 indexed_changes = {}
                 if isinstance(values, bool):
                     indexed_changes[min_year] = values
-                elif isinstance(values, list):
+                else:
                     for vo in values:
                         indexed_changes[vo.get("year", min_year)] = vo["value"]
-                else:
-                    raise Exception(
-                        "Index adjustment parameter must be a boolean or list."
-                    )
                 # 2.a Adjust values less than first year in which index status
                 # was changed.
                 if base_param in params:
+                    adj_index = YearIndex(params[base_param])
                     min_index_change_year = min(indexed_changes.keys())
-                    vos = select_lt(
-                        params[base_param],
-                        False,
-                        {"year": min_index_change_year}
-                    )
+                    vos = adj_index.select("lt", min_index_change_year)
                     if vos:
                         min_adj_year = min(
                             vos,
                             key=lambda vo: vo["year"]
                         )["year"]
-                        gt = self.select_gt(
-                            base_param,
-                            True,
-                            year=min_adj_year
-                        )
-                        super().adjust(
-                            {
-                                base_param: [
-                                    dict(vo, **{"value": None}) for vo in gt
-                                ]
-                            }
-                        )
+                        self._delete_after({base_param: min_adj_year})
                         super().adjust({base_param: vos}, **kwargs)
                         self.extend(
                             params=[base_param],
@@ -222,16 +659,9 @@ class TaxParams(pt.Parameters):
 
                 for year in sorted(indexed_changes):
                     indexed_val = indexed_changes[year]
-                    # Get and delete all default values after year where
-                    # indexed status changed.
-                    gte = self.select_gt(base_param, True, year=year)
-                    super().adjust(
-                        {
-                            base_param: [
-                                dict(vo, **{"value": None}) for vo in gte
-                            ]
-                        }
-                    )
+                    # Delete all default values after year where indexed
+                    # status changed.
+                    self._delete_after({base_param: year})
 
                     # 2.b Extend values for this parameter to the year where
                     # the indexed status changes.
@@ -250,9 +680,7 @@ class TaxParams(pt.Parameters):
                     # 2.d Adjust with values greater than or equal to current
                     # year in params
                     if base_param in params:
-                        vos = pt.select_gt(
-                            params[base_param], False, {"year": year - 1}
-                        )
+                        vos = adj_index.select("gt", year - 1)
                         super().adjust({base_param: vos}, **kwargs)
 
                     # 2.e Extend values through remaining years.
@@ -271,9 +699,12 @@ class TaxParams(pt.Parameters):
 
         needs_reset = set(needs_reset) - set(nonindexed_params.keys())
         if needs_reset:
+            stats.phase("set_state")
+            stats.count("params_reset", len(needs_reset))
             self._set_state(params=needs_reset)
 
         # 3. Do adjustment for all non-indexing related parameters.
+        stats.phase("adjust")
         adj = super().adjust(nonindexed_params, **kwargs)
 
         # 4. Add indexing params back for return to user.
@@ -283,8 +714,761 @@ class TaxParams(pt.Parameters):
                 if param in index_affected
             }
         )
+
+        if cache_key is not None and not self._errors.get("messages"):
+            stats.phase("reform_cache")
+            snapshot = self._snapshot()
+            self.reform_cache.put(cache_key, (snapshot, copy.deepcopy(adj)))
+            self._reform_fingerprint = cache_key
         return adj
 
+    def _adjust(self, params_or_path, **kwargs):
+        """
+        Count each call to paramtools.Parameters._adjust in the stats of the
+        adjust call that is running, including the calls made by extend and
+        _reextend.
+        """
+        self._active_stats.count("adjust_calls")
+        return super()._adjust(params_or_path, **kwargs)
+
+    def _validate_value_objects(self, params):
+        """
+        Check the value objects of the parameters in params that adjust
+        reads before ParamTools validates them. Each one must have a value
+        and only use labels that the parameter's values use. CPI_offset
+        must be a list of value objects with a year. Unknown parameters and
+        "-indexed" adjustments are left to ParamTools and
+        _validate_indexed_params.
+
+        Raises:
+            pt.ValidationError: with a message for each invalid adjustment.
+        """
+        messages = {}
+        for param, values in params.items():
+            if param not in self._data:
+                continue
+            if not isinstance(values, list):
+                if param == "CPI_offset":
+                    messages[param] = [
+                        "CPI_offset must be a list of value objects."
+                    ]
+                continue
+            vos = self._data[param]["value"]
+            used = set(vos[0]) if vos else set(self._stateless_label_grid)
+            errors = []
+            for vo in values:
+                if not isinstance(vo, dict) or "value" not in vo:
+                    errors.append("Value objects must be dicts with a value.")
+                    continue
+                unused = [
+                    label for label in vo
+                    if label in self._stateless_label_grid
+                    and label not in used
+                ]
+                for label in unused:
+                    errors.append(f"Label {label} is not used by {param}.")
+                if param == "CPI_offset" and "year" not in vo:
+                    errors.append("CPI_offset value objects must have a year.")
+            if errors:
+                messages[param] = list(dict.fromkeys(errors))
+        if messages:
+            raise pt.ValidationError({"errors": messages}, labels=None)
+
+    def _validate_indexed_params(self, params):
+        """
+        Check the "-indexed" adjustments in params before any values are
+        modified. Each one must be for an indexable parameter and must be a
+        boolean or a list of value objects with boolean values. Booleans
+        are deserialized like ParamTools does, so 1, 0, "true", and NumPy
+        booleans are accepted.
+
+        Returns: params with the "-indexed" values converted to bools.
+
+        Raises:
+            pt.ValidationError: with a message for each invalid adjustment,
+                under the "-indexed" name of the adjustment.
+        """
+        messages = {}
+        years = self._stateless_label_grid["year"]
+        field = ma.fields.Boolean()
+        converted = dict(params)
+        for param, values in params.items():
+            if not param.endswith("-indexed"):
+                continue
+            base_param = param.split("-indexed")[0]
+            if base_param not in self._data:
+                messages[param] = [f"Unknown parameter: {base_param}."]
+                continue
+            if not self._data[base_param].get("indexable", None):
+                messages[param] = [f"Parameter {base_param} is not indexable."]
+                continue
+            try:
+                if isinstance(values, list):
+                    if not all(
+                        isinstance(vo, dict)
+                        and "value" in vo
+                        and set(vo) <= {"year", "value"}
+                        and vo.get("year", years[0]) in years
+                        for vo in values
+                    ):
+                        raise ma.ValidationError("Not a value object.")
+                    converted[param] = [
+                        dict(vo, value=field.deserialize(vo["value"]))
+                        for vo in values
+                    ]
+                else:
+                    converted[param] = field.deserialize(values)
+            except ma.ValidationError:
+                messages[param] = [
+                    "Index adjustment must be a boolean or a list of value "
+                    f"objects with a year from {years[0]} to {years[-1]} and "
+                    "a boolean value."
+                ]
+        if messages:
+            raise pt.ValidationError({"errors": messages}, labels=None)
+        return converted
+
+    def _reform_cache_key(self, params, kwargs):
+        """
+        Key of the result of adjusting this instance with params. Returns None
+        if the result can not be cached.
+        """
+        if (
+            self.reform_cache is None
+            or self._reform_fingerprint is None
+            or self._errors.get("messages")
+        ):
+            return None
+        cls = type(self)
+        return reform_fingerprint(
+            params,
+            f"{cls.__module__}.{cls.__qualname__}",
+            self._reform_fingerprint,
+            self._state,
+            kwargs,
+            [
+                self.array_first,
+                self.label_to_extend,
+                self.uses_extend_func,
+                self.lazy_arrays,
+            ],
+        )
+
+    def _snapshot(self, params=None):
+        """
+        Capture everything that adjust modifies: the parameter values, their
+        indexed status, the inflation rates, the parameter attributes, and
+        the warnings. The value objects are encoded in a ValueStore, so a
+        snapshot, and the cache entries and pickles that are built from it,
+        use a small fraction of the memory of the value object dicts. The
+        instance itself still holds the dicts.
+
+        Arguments:
+            params: parameters to capture. Defaults to all parameters.
+
+        Returns: snapshot that can be passed to _restore.
+        """
+        if params is None:
+            params = list(self._data)
+        return {
+            "values": ValueStore.from_data(
+                {param: self._data[param]["value"] for param in params},
+                self._stateless_label_grid,
+            ),
+            "indexed": {
+                param: self._data[param]["indexed"]
+                for param in params
+                if "indexed" in self._data[param]
+            },
+            "inflation_rates": copy.copy(self._inflation_rates),
+            "wage_growth_rates": self._wage_growth_rates,
+            "attrs": {
+                param: copy.copy(self.__dict__[param])
+                for param in params
+                if param in self.__dict__
+            },
+            "warnings": copy.deepcopy(self._warnings),
+        }
+
+    def _diff_params(self, other):
+        """
+        Find the parameters whose values or indexed status differ from
+        other. Value objects are compared by identity, which is exact for
+        instances that were forked from each other. Parameters that were
+        adjusted to their current values are included.
+
+        Returns: list of parameter names.
+        """
+        params = []
+        for param, data in self._data.items():
+            other_data = other._data[param]
+            vos, other_vos = data["value"], other_data["value"]
+            if (
+                data.get("indexed") != other_data.get("indexed")
+                or len(vos) != len(other_vos)
+                or any(vo is not other_vo for vo, other_vo in zip(vos, other_vos))
+            ):
+                params.append(param)
+        return params
+
+    def _restore(self, snapshot):
+        """
+        Reset this instance to a snapshot created by _snapshot. The snapshot
+        is not modified and can be restored again.
+        """
+        for param in snapshot["values"]:
+            self._data[param]["value"] = snapshot["values"].value_objects(param)
+            self._shared_values.discard(param)
+        for param, indexed in snapshot["indexed"].items():
+            self._data[param]["indexed"] = indexed
+        for param in snapshot["values"]:
+            self._search_trees.pop(param, None)
+            self._year_indexes.pop(param, None)
+            self._stacked.pop(param, None)
+        self._inflation_rates = copy.copy(snapshot["inflation_rates"])
+        self._wage_growth_rates = snapshot["wage_growth_rates"]
+        missing = []
+        for param in snapshot["values"]:
+            if param in snapshot["attrs"]:
+                setattr(self, param, copy.copy(snapshot["attrs"][param]))
+            else:
+                # The attribute was not built when the snapshot was taken.
+                self.__dict__.pop(param, None)
+                missing.append(param)
+        if missing and not self.lazy_arrays:
+            self._set_state(params=missing)
+        self._warnings = copy.deepcopy(snapshot["warnings"])
+
+    def extend(
+        self,
+        label_to_extend=None,
+        label_to_extend_values=None,
+        params=None,
+        raise_errors=True,
+        ignore_warnings=False,
+    ):
+        """
+        Extend parameters along the year label. The missing values of all
+        parameters are computed at once with NumPy instead of value object by
+        value object. The values are the same as those from ParamTools'
+        extend and they are validated with the same adjustment.
+        """
+        self._active_stats.count("extend_calls")
+        if label_to_extend is None:
+            label_to_extend = self.label_to_extend
+        if label_to_extend != "year" or not self._extends_with_numpy():
+            return super().extend(
+                label_to_extend=label_to_extend,
+                label_to_extend_values=label_to_extend_values,
+                params=params,
+                raise_errors=raise_errors,
+                ignore_warnings=ignore_warnings,
+            )
+
+        extend_grid = list(
+            label_to_extend_values or self._stateless_label_grid["year"]
+        )
+        if params is None:
+            params = self._data
+        adjustment = self._extension(params, extend_grid)
+
+        # Ensure that the adjust method of paramtools.Parameter is used.
+        self._adjust(
+            adjustment,
+            extend_adj=False,
+            ignore_warnings=ignore_warnings,
+            raise_errors=raise_errors,
+        )
+
+    def _extends_with_numpy(self):
+        """
+        Returns: whether parameters can be extended with _extension, i.e.
+            extend_func has not been overridden.
+        """
+        return type(self).extend_func is pt.Parameters.extend_func
+
+    def _extension(self, params, extend_grid):
+        """
+        Compute the value objects that extend params to every year in
+        extend_grid.
+
+        Returns: adjustment with the new value objects of each parameter.
+        """
+        year_ix = {year: ix for ix, year in enumerate(extend_grid)}
+
+        # Group the value objects of each parameter into columns, one for each
+        # combination of the other labels.
+        columns = []
+        for param in params:
+            groups = self._year_columns(param, year_ix)
+            if groups is None:
+                continue
+            indexed = self.uses_extend_func and self._data[param].get(
+                "indexed", False
+            )
+            for known in groups.values():
+                if len(known) < len(extend_grid):
+                    columns.append((param, indexed, known))
+
+        num_years = len(extend_grid)
+        known = np.zeros((num_years, len(columns)), dtype=bool)
+        for col, (_, _, known_vos) in enumerate(columns):
+            known[list(known_vos), col] = True
+        source = source_index(known)
+
+        # Compute the values of the indexed columns in one pass.
+        indexed_cols = [
+            col for col, (_, indexed, _) in enumerate(columns) if indexed
+        ]
+        values = np.zeros((num_years, len(indexed_cols)))
+        rates = np.zeros((num_years, len(indexed_cols)))
+        param_rates = {}
+        for ix, col in enumerate(indexed_cols):
+            param, _, known_vos = columns[col]
+            for year_ix_, vo in known_vos.items():
+                values[year_ix_, ix] = vo["value"]
+            if param not in param_rates:
+                param_rates[param] = [
+                    self.get_index_rate(param, year) for year in extend_grid
+                ]
+            rates[:, ix] = param_rates[param]
+        extended = extend_values(values, known[:, indexed_cols], rates)
+        extended_values = dict(zip(indexed_cols, extended.T))
+
+        adjustment = defaultdict(list)
+        for col, (param, indexed, known_vos) in enumerate(columns):
+            for ix, year in enumerate(extend_grid):
+                if ix in known_vos:
+                    continue
+                vo = dict(known_vos[source[ix, col]], year=year)
+                if indexed:
+                    vo["value"] = extended_values[col][ix]
+                adjustment[param].append(vo)
+        return adjustment
+
+    def _year_columns(self, param, year_ix):
+        """
+        Group the value objects of a parameter into columns, one for each
+        combination of the labels other than year. Value objects whose year
+        is not in year_ix are skipped.
+
+        Returns: dict of {labels: {year index: value object}} or None if a
+            value object does not have a year label.
+        """
+        groups = {}
+        for vo in self._data[param]["value"]:
+            if "year" not in vo:
+                return None
+            if vo["year"] not in year_ix:
+                continue
+            labels = tuple(
+                (label, value)
+                for label, value in vo.items()
+                if label not in ("year", "value")
+            )
+            groups.setdefault(labels, {})[year_ix[vo["year"]]] = vo
+        return groups
+
+    def _range_references(self):
+        """
+        Find the parameters that are related by range validators that
+        compare them to each other.
+
+        Returns: dict of {param: set of related parameters}. Parameters that
+            are compared to their own default value are related to
+            "default".
+        """
+        refs = defaultdict(set)
+        for param, data in self._data.items():
+            bounds = data.get("validators", {}).get("range", {})
+            for op in ("min", "max"):
+                other = bounds.get(op)
+                if other == "default":
+                    refs[param].add("default")
+                elif isinstance(other, str) and other in self._data:
+                    refs[param].add(other)
+                    refs[other].add(param)
+        return refs
+
+    def _reextend(self, cuts):
+        """
+        Re-extend the values of each indexed parameter after the
+        corresponding year in cuts, a dict of {param: year}, with the current
+        rates. This gives the same values as deleting the values after each
+        year and extending the parameters again, but only the values that
+        change are written and validated.
+
+        Parameters that are related by range validators to a parameter whose
+        values change are written in full so that they are validated against
+        each other in the same way. Parameters that do not have a value for
+        each year and combination of labels are deleted and extended.
+
+        Returns: parameters whose values were modified.
+        """
+        grid = list(self._stateless_label_grid["year"])
+        year_ix = {year: ix for ix, year in enumerate(grid)}
+        refs = self._range_references()
+
+        fallback = {}
+        columns = []
+        for param, cut in cuts.items():
+            groups = self._year_columns(param, year_ix)
+            if (
+                groups is None
+                or "default" in refs.get(param, ())
+                or cut not in year_ix
+                or any(len(known) < len(grid) for known in groups.values())
+            ):
+                fallback[param] = cut
+                continue
+            for known in groups.values():
+                columns.append((param, year_ix[cut], known))
+
+        num_years = len(grid)
+        years = np.arange(num_years)[:, np.newaxis]
+        values = np.zeros((num_years, len(columns)))
+        rates = np.zeros((num_years, len(columns)))
+        cut_ix = np.zeros(len(columns), dtype=int)
+        param_rates = {}
+        for col, (param, cut, known) in enumerate(columns):
+            values[:, col] = [known[ix]["value"] for ix in range(num_years)]
+            if param not in param_rates:
+                param_rates[param] = [
+                    self.get_index_rate(param, year) for year in grid
+                ]
+            rates[:, col] = param_rates[param]
+            cut_ix[col] = cut
+        extended = extend_values(values, years <= cut_ix, rates)
+        changed_cells = (extended != values) & (years > cut_ix)
+
+        # Parameters related to a changed parameter by range validators are
+        # written in full.
+        changed = set(
+            columns[col][0] for col in np.flatnonzero(changed_cells.any(axis=0))
+        )
+        incremental = set(param for param, _, _ in columns)
+        full = set([])
+        stack = [param for param in changed if refs.get(param)]
+        while stack:
+            param = stack.pop()
+            if param not in full:
+                full.add(param)
+                stack.extend(refs[param] & incremental)
+
+        adjustment = defaultdict(list)
+        extended = extended.T.tolist()
+        for col, (param, cut, known) in enumerate(columns):
+            if param in full:
+                to_write = range(cut + 1, num_years)
+            else:
+                to_write = np.flatnonzero(changed_cells[:, col])
+            for ix in to_write:
+                adjustment[param].append(
+                    dict(known[ix], value=extended[col][ix])
+                )
+
+        if adjustment:
+            self._adjust(adjustment, extend_adj=False)
+        if fallback:
+            self._delete_after(fallback)
+            self.extend(label_to_extend="year")
+        return list(adjustment) + list(fallback)
+
+    def _delete_after(self, years):
+        """
+        Delete the values of each parameter after the corresponding year in
+        years, a dict of {param: year}. This is a trusted internal path that
+        deletes values for many parameters in one pass without the
+        deserialization and validation done by adjust.
+        """
+        for param, year in years.items():
+            vos = self._data[param]["value"]
+            index = self._year_index(param)
+            if index.complete:
+                keep = index.select("lte", year)
+            else:
+                keep = [vo for vo in vos if vo.get("year", year) <= year]
+            if len(keep) < len(vos):
+                self._active_stats.count("value_objects", len(vos) - len(keep))
+                self._data[param]["value"] = keep
+                self._search_trees.pop(param, None)
+                self._stacked.pop(param, None)
+
+    def _update_param(self, param, new_values):
+        """
+        Copy the value objects of a parameter that are shared with a forked
+        instance before ParamTools modifies them in place.
+        """
+        if param in self._shared_values:
+            self._data[param]["value"] = [
+                dict(vo) for vo in self._data[param]["value"]
+            ]
+            self._search_trees.pop(param, None)
+            self._shared_values.discard(param)
+        self._reform_fingerprint = None
+        self._stacked.pop(param, None)
+        self._active_stats.count("value_objects", len(new_values))
+        super()._update_param(param, new_values)
+        if any(vo["value"] is None for vo in new_values):
+            # Deleted value objects shift the positions stored in the index.
+            self._year_indexes.pop(param, None)
+
+    def _year_index(self, param):
+        """
+        Return the YearIndex of a parameter's value objects. The index is
+        rebuilt if the list of value objects has been replaced and it picks
+        up appended value objects on its own.
+        """
+        vos = self._data[param]["value"]
+        index = self._year_indexes.get(param)
+        if index is None or index.vos is not vos:
+            index = YearIndex(vos)
+            self._year_indexes[param] = index
+        return index
+
+    def _select_years(self, param, op, exact_match, labels):
+        """
+        Answer a select query on the year label with the parameter's year
+        index. Returns None if the query can not be answered by the index.
+        Queries with exact_match set to False, and parameters whose value
+        objects do not all have the same labels, are left to ParamTools,
+        which handles labels that only some value objects use.
+        """
+        year = labels.get("year")
+        if (
+            not exact_match
+            or year is None
+            or isinstance(year, list)
+            or param not in self._data
+        ):
+            return None
+        other = {
+            label: value for label, value in labels.items() if label != "year"
+        }
+        # ParamTools compares all labels with the operator, not only year.
+        if other and op != "eq":
+            return None
+        if any(isinstance(value, list) for value in other.values()):
+            return None
+        index = self._year_index(param)
+        if not index.uniform or not index.complete:
+            return None
+        if other and set(other) != index.label_names:
+            return None
+        vos = index.select(op, year, other)
+        if not vos and other:
+            # ParamTools matches the other labels on their own when no value
+            # objects match the year.
+            return None
+        return vos
+
+    def select_eq(self, param, exact_match, **labels):
+        vos = self._select_years(param, "eq", exact_match, labels)
+        if vos is None:
+            return super().select_eq(param, exact_match, **labels)
+        return vos
+
+    def select_gt(self, param, exact_match, **labels):
+        vos = self._select_years(param, "gt", exact_match, labels)
+        if vos is None:
+            return super().select_gt(param, exact_match, **labels)
+        return vos
+
+    def select_lt(self, param, exact_match, **labels):
+        vos = self._select_years(param, "lt", exact_match, labels)
+        if vos is None:
+            return super().select_lt(param, exact_match, **labels)
+        return vos
+
+    def stacked_array(self, param):
+        """
+        Array of a parameter's values in all years, with shape
+        (num_years, *label_dims), independent of the state. It is built on
+        first access after the parameter is adjusted and it is read-only.
+
+        Returns: stacked array of param.
+        """
+        return self._stacked_array(param)[0]
+
+    def _stacked_array(self, param):
+        """
+        Returns: stacked array of param and whether its first dimension is
+            the year.
+        """
+        if param not in self._data:
+            raise KeyError(param)
+        stacked = self._stacked.get(param)
+        if stacked is None:
+            state, label_grid = self._state, self.label_grid
+            self._state = {}
+            self.label_grid = self._stateless_label_grid
+            try:
+                arr = self.to_array(param)
+            finally:
+                self._state, self.label_grid = state, label_grid
+            if isinstance(arr, np.ndarray):
+                arr.flags.writeable = False
+            vos = self._data[param]["value"]
+            stacked = (arr, bool(vos) and "year" in vos[0])
+            self._stacked[param] = stacked
+        return stacked
+
+    def to_policy_arrays(self, params=None, policy=None):
+        """
+        Tax-Calculator compatible arrays of the parameters: one row for each
+        year from the start year to the end year, like the _param arrays of
+        taxcalc.Policy and the attributes after set_state(). The arrays of
+        all parameters that have not been stacked yet are built from one
+        ValueStore, see ValueStore.to_array, and are cached as the stacked
+        arrays.
+
+        Arguments:
+            params: parameters to export. Defaults to all parameters.
+            policy: taxcalc.Policy instance to write the arrays to. Copies
+                of the arrays replace its _param arrays and its parameters'
+                indexed status and indexing rates are set to those of this
+                instance. Its current year attributes are updated with
+                set_year. This skips implement_reform and the indexing that
+                it does.
+
+        Returns: dict of {param: read-only array}.
+
+        Raises:
+            ValueError: policy does not have the same years as this instance.
+        """
+        params = list(self._data) if params is None else list(params)
+        missing = [param for param in params if param not in self._stacked]
+        if missing:
+            store = ValueStore.from_data(
+                {param: self._data[param]["value"] for param in missing},
+                self._stateless_label_grid,
+            )
+            for param in missing:
+                arr = store.to_array(param, dtype=self._numpy_type(param))
+                if arr is None:
+                    self._stacked_array(param)
+                    continue
+                arr.flags.writeable = False
+                vos = self._data[param]["value"]
+                self._stacked[param] = (arr, bool(vos) and "year" in vos[0])
+        arrays = {param: self._stacked[param][0] for param in params}
+        if policy is not None:
+            self._write_policy(policy, arrays)
+        return arrays
+
+    def to_delta(self):
+        """
+        Returns: BaselineDelta with only the values that differ from the
+            baseline instance of this class, see from_baseline.
+        """
+        return BaselineDelta.from_taxparams(self)
+
+    def diff(self, other):
+        """
+        Find the values that differ from other in all years by comparing
+        the stacked arrays, see taxparams.delta.diff.
+
+        Returns: dict of {param: (index, values, other values)}.
+        """
+        return diff(self, other)
+
+    def _write_policy(self, policy, arrays):
+        """
+        Write arrays, the output of to_policy_arrays, to a taxcalc.Policy.
+        """
+        years = self._stateless_label_grid["year"]
+        if (policy.start_year, policy.num_years) != (years[0], len(years)):
+            raise ValueError(
+                f"policy has {policy.num_years} years from {policy.start_year}"
+                f", but TaxParams has {len(years)} years from {years[0]}."
+            )
+        for param, arr in arrays.items():
+            name = f"_{param}"
+            setattr(policy, name, np.array(arr))
+            vals = policy._vals.get(name)
+            if vals is not None and "indexed" in vals:
+                vals["indexed"] = bool(self._data[param].get("indexed", False))
+        policy._inflation_rates = self.inflation_rates()
+        policy._wage_growth_rates = self.wage_growth_rates()
+        policy.set_year(policy.current_year)
+
+    def year_view(self, year):
+        """
+        Returns: YearView of the parameter values in year. Its arrays have
+            the same values as the attributes after set_state(year=year),
+            but they are slices of the stacked arrays and are not copied.
+        """
+        return YearView(self, year)
+
+    def iter_years(self):
+        """
+        Yield a YearView for each year from start_year to end_year.
+        """
+        for year in self._stateless_label_grid["year"]:
+            yield YearView(self, year)
+
+    def __getattr__(self, name):
+        """
+        Build the attribute of a parameter on first access if lazy_arrays is
+        set. This is only called if the attribute does not exist.
+        """
+        data = self.__dict__.get("_data")
+        if not self.lazy_arrays or data is None or name not in data:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}"
+            )
+        if self.array_first:
+            value = self.to_array(name)
+        else:
+            value = self.select_eq(name, False, **self._state)
+        setattr(self, name, value)
+        return value
+
+    def _set_state(self, params=None, **labels):
+        """
+        Update the state like ParamTools. If lazy_arrays is set, the
+        attributes of params are deleted instead of being built. They are
+        built again when they are accessed, see __getattr__.
+        """
+        if not self.lazy_arrays:
+            return super()._set_state(params=params, **labels)
+        messages = {}
+        for name, values in labels.items():
+            if name not in self.label_validators:
+                messages[name] = f"{name} is not a valid label."
+                continue
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                try:
+                    self.label_validators[name].deserialize(value)
+                except ma.ValidationError as ve:
+                    messages[name] = str(ve)
+        if messages:
+            raise pt.ValidationError({"errors": messages}, labels=None)
+        self._state.update(labels)
+        for label_name, label_value in self._state.items():
+            if not isinstance(label_value, list):
+                label_value = [label_value]
+            self.label_grid[label_name] = label_value
+        for param in self._data if params is None else params:
+            if param in collision_list:
+                raise ParameterNameCollisionException(
+                    f"The paramter name, '{param}', is already used by the "
+                    f"Parameters object."
+                )
+            self.__dict__.pop(param, None)
+
+    def sort_values(self, data=None, has_meta_data=True):
+        # Sorting re-orders value objects in place, which invalidates the
+        # year indexes. Lists that are shared with a fork or a checkpoint are
+        # copied first.
+        self._year_indexes = {}
+        if data is None:
+            for param in self._shared_values:
+                self._data[param]["value"] = list(self._data[param]["value"])
+        return super().sort_values(data=data, has_meta_data=has_meta_data)
+
     def get_index_rate(self, param, label_to_extend_val):
         """
         Initalize indexing data and return the indexing rate value
@@ -292,7 +1476,7 @@ class TaxParams(pt.Parameters):
         label_to_extend.
         Returns: rate to use for indexing.
         """
-        if not self._inflation_rates or not self._wage_growth_rates:
+        if self._inflation_rates is None or self._wage_growth_rates is None:
             self.set_rates()
         if param in self.WAGE_INDEXED_PARAMS:
             return self.wage_growth_rates(year=label_to_extend_val)
@@ -300,14 +1484,27 @@ class TaxParams(pt.Parameters):
             return self.inflation_rates(year=label_to_extend_val)
 
     def wage_growth_rates(self, year=None):
+        """
+        Returns: wage growth rate of year, or a new list of the rates of all
+            years. The rates are held in a read-only array that is shared
+            between instances, so it is not returned.
+        """
         if year is not None:
             return self._wage_growth_rates[year - self.start_year]
-        return self._wage_growth_rates or []
+        if self._wage_growth_rates is None:
+            return []
+        return list(self._wage_growth_rates)
 
     def inflation_rates(self, year=None):
+        """
+        Returns: inflation rate of year, or a new list of the rates of all
+            years.
+        """
         if year is not None:
             return self._inflation_rates[year - self.start_year]
-        return self._inflation_rates or []
+        if self._inflation_rates is None:
+            return []
+        return list(self._inflation_rates)
 
     def set_rates(self):
         """Initialize taxcalc indexing data."""
@@ -315,19 +1512,15 @@ class TaxParams(pt.Parameters):
         # extend cpi_offset values through budget window if they
         # have not been extended already.
         cpi_vals = cpi_vals + cpi_vals[-1:] * (2030 - 2013 + 1 - len(cpi_vals))
-        cpi_offset = {(2013 + ix): val for ix, val in enumerate(cpi_vals)}
-
-        if not self._gfactors:
-            self._gfactors = taxcalc.GrowFactors()
 
-        self._inflation_rates = [
-            np.round(rate + cpi_offset[2013 + ix], 4)
-            for ix, rate in enumerate(
-                self._gfactors.price_inflation_rates(2013, 2030)
-            )
-        ]
-
-        self._wage_growth_rates = self._gfactors.wage_growth_rates(2013, 2030)
+        self._gfactors = utils.growfactors()
+        inflation_rates, wage_growth_rates = utils.index_rates(
+            tuple(cpi_vals), 2013, 2030
+        )
+        # The cached rates are shared. Copy the inflation rates since adjust
+        # updates them in place when CPI_offset changes.
+        self._inflation_rates = inflation_rates.copy()
+        self._wage_growth_rates = wage_growth_rates
 
     @property
     def current_year(self):
@@ -347,4 +1540,6 @@ class TaxParams(pt.Parameters):
 
     @property
     def _last_known_year(self):
+        import taxcalc
+
         return taxcalc.Policy.LAST_KNOWN_YEAR
@@ -0,0 +1,149 @@
+from collections import namedtuple, OrderedDict
+import hashlib
+import json
+import sys
+import threading
+
+import numpy as np
+
+from taxparams.store import ValueStore
+
+
+CacheInfo = namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "evictions", "maxsize", "currsize", "nbytes"],
+)
+
+
+def reform_fingerprint(params, *context):
+    """
+    Hash the output of read_params with the JSON-serializable context that
+    the result of the adjustment depends on. Keys are sorted so that the same
+    reform always gives the same fingerprint. The order of value objects is
+    kept since later value objects take precedence over earlier ones.
+
+    Returns: hex digest.
+    """
+    h = hashlib.sha256()
+    for item in (params,) + context:
+        h.update(
+            json.dumps(
+                item, sort_keys=True, separators=(",", ":"), default=str
+            ).encode()
+        )
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def sizeof(obj, seen=None):
+    """
+    Estimate the memory used by obj and the containers, arrays, and scalars
+    that it references. Objects that are referenced more than once are only
+    counted once.
+    """
+    if seen is None:
+        seen = set([])
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + (0 if obj.base is None else obj.nbytes)
+    if isinstance(obj, ValueStore):
+        return sys.getsizeof(obj) + obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += sizeof(key, seen) + sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set)):
+        for item in obj:
+            size += sizeof(item, seen)
+    return size
+
+
+class ReformCache:
+    """
+    Thread-safe LRU cache of adjustment results. Entries are evicted when
+    there are more than maxsize of them or when their estimated size is
+    greater than max_bytes. Set either limit to None to turn it off.
+
+    Pass an instance to TaxParams.reform_cache to cache the results of
+    TaxParams.adjust:
+
+        TaxParams.reform_cache = ReformCache(maxsize=64)
+    """
+
+    def __init__(self, maxsize=128, max_bytes=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns: cached value for key or None if there is not one.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes=None):
+        """
+        Add value to the cache and evict the least recently used entries
+        until the cache is within its limits. Values that are larger than
+        max_bytes on their own are not cached.
+        """
+        if nbytes is None:
+            nbytes = sizeof(value)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self._entries and (
+                (self.maxsize is not None and len(self._entries) > self.maxsize)
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                _, (_, size) = self._entries.popitem(last=False)
+                self.nbytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all entries and reset the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.nbytes = 0
+
+    def cache_info(self):
+        """
+        Returns: CacheInfo with the hit, miss, and eviction counts and the
+        current number and estimated size of the entries.
+        """
+        with self._lock:
+            return CacheInfo(
+                self.hits,
+                self.misses,
+                self.evictions,
+                self.maxsize,
+                len(self._entries),
+                self.nbytes,
+            )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
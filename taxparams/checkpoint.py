@@ -0,0 +1,56 @@
+import copy
+
+
+class Checkpoint:
+    """
+    State of a TaxParams instance that is saved by TaxParams.checkpoint and
+    restored by TaxParams.rollback: the parameter values, their indexed
+    status, the indexing rates, and the parameter attributes.
+
+    The lists of value objects and the attribute arrays are shared with the
+    instance instead of copied. The instance copies the value objects of a
+    parameter before it modifies them, see TaxParams._update_param, so the
+    checkpoint is not affected by later adjustments and can be rolled back
+    to more than once.
+    """
+
+    def __init__(self, taxparams):
+        self.owner = taxparams
+        self.values = {
+            param: data["value"] for param, data in taxparams._data.items()
+        }
+        self.indexed = {
+            param: data.get("indexed") for param, data in taxparams._data.items()
+        }
+        self.attrs = {
+            param: taxparams.__dict__[param]
+            for param in taxparams._data
+            if param in taxparams.__dict__
+        }
+        self.stacked = dict(taxparams._stacked)
+        self.state = dict(taxparams._state)
+        # The rates are None if they have not been computed yet.
+        self.inflation_rates = copy.copy(taxparams._inflation_rates)
+        self.wage_growth_rates = taxparams._wage_growth_rates
+        self.warnings = copy.deepcopy(taxparams._warnings)
+        self.errors = copy.deepcopy(taxparams._errors)
+        self.fingerprint = taxparams._reform_fingerprint
+
+    def changed_params(self):
+        """
+        Find the parameters whose values or indexed status have been
+        modified since the checkpoint was created. Modified parameters
+        have a new list of value objects.
+
+        Returns: list of parameter names.
+        """
+        data = self.owner._data
+        return [
+            param
+            for param, vos in self.values.items()
+            if data[param]["value"] is not vos
+            or data[param].get("indexed") != self.indexed[param]
+        ]
+
+    def __repr__(self):
+        return f"Checkpoint(changed_params={self.changed_params()})"
@@ -0,0 +1,151 @@
+import argparse
+from collections import deque
+import functools
+import json
+import sys
+
+import numpy as np
+import paramtools as pt
+
+from taxparams import TaxParams
+from taxparams.parallel import iter_adjust
+
+
+def reform_arrays(taxparams, all_params=False):
+    """
+    Tax-Calculator compatible arrays of an adjusted instance's parameters:
+    one row for each year from the start year to the end year.
+
+    Arguments:
+        taxparams: adjusted instance that was forked from the baseline.
+        all_params: return all parameters instead of only the parameters
+            that differ from the baseline.
+
+    Returns: dict of {param: nested list of values}.
+    """
+    if all_params:
+        params = list(taxparams._data)
+    else:
+        params = taxparams._diff_params(type(taxparams)._baseline)
+    return {
+        param: np.asarray(getattr(taxparams, param)).tolist()
+        for param in params
+    }
+
+
+def load_reform(text):
+    """
+    Parse a reform from JSON text. Unlike read_params, text is never
+    treated as a file path.
+
+    Returns: dict of adjustments.
+
+    Raises:
+        pt.ValidationError: if text is not a JSON object.
+    """
+    try:
+        reform = json.loads(text)
+    except ValueError as e:
+        raise pt.ValidationError({"errors": {"reform": [str(e)]}}, labels=None)
+    if not isinstance(reform, dict):
+        raise pt.ValidationError(
+            {"errors": {"reform": ["The reform must be a JSON object."]}},
+            labels=None,
+        )
+    return reform
+
+
+def read_reforms(f):
+    """
+    Yield (line number, reform) for each non-empty line of f. reform is a
+    dict, or a ValidationError if the line is not a JSON object.
+    """
+    for lineno, line in enumerate(f, start=1):
+        line = line.strip()
+        if line:
+            try:
+                yield lineno, load_reform(line)
+            except pt.ValidationError as ve:
+                yield lineno, ve
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="taxparams",
+        description=(
+            "Adjust the default parameters with each reform in a JSON Lines "
+            "file and write the resulting parameter arrays or validation "
+            "errors as JSON Lines in the same order."
+        ),
+    )
+    parser.add_argument(
+        "input",
+        nargs="?",
+        default="-",
+        help="JSON Lines file with one reform per line. Defaults to stdin.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="File to write results to. Defaults to stdout.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help=(
+            "Maximum number of reforms that are read but not written yet. "
+            "Defaults to four times the number of workers."
+        ),
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Write all parameters instead of only the modified ones.",
+    )
+    args = parser.parse_args(argv)
+
+    fin = sys.stdin if args.input == "-" else open(args.input)
+    fout = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        # Line numbers of the reforms that are read but not written yet.
+        # iter_adjust passes lines that are not JSON objects through in
+        # order and counts them towards max_pending, so this stays short.
+        lines = deque()
+
+        def reforms():
+            for lineno, reform in read_reforms(fin):
+                lines.append(lineno)
+                yield reform
+
+        results = iter_adjust(
+            TaxParams,
+            reforms(),
+            workers=args.workers,
+            max_pending=args.max_pending,
+            result_func=functools.partial(reform_arrays, all_params=args.all),
+        )
+        for result in results:
+            record = {"line": lines.popleft()}
+            if isinstance(result, Exception):
+                record.update(result.messages)
+            else:
+                record["params"] = result
+            fout.write(json.dumps(record, default=str) + "\n")
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+
+
+if __name__ == "__main__":
+    main()
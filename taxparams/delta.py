@@ -0,0 +1,324 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+from taxparams.store import ValueStore
+from taxparams.views import ParamsView
+
+
+def changed_cells(arr, other):
+    """
+    Returns: flat positions of the cells of arr that differ from other.
+        NaN values are equal to each other.
+    """
+    different = arr != other
+    if arr.dtype.kind == "f" and other.dtype.kind == "f":
+        different &= ~(np.isnan(arr) & np.isnan(other))
+    return np.flatnonzero(different)
+
+
+def _baseline(cls):
+    """
+    Returns: baseline instance of cls, see TaxParams.from_baseline.
+    """
+    baseline = cls.__dict__.get("_baseline")
+    if baseline is None:
+        cls.from_baseline()
+        baseline = cls._baseline
+    return baseline
+
+
+def _candidates(a, b):
+    """
+    Returns: list of the parameters that may differ between a and b.
+    """
+    if (
+        isinstance(a, BaselineDelta)
+        and isinstance(b, BaselineDelta)
+        and a.baseline is b.baseline
+    ):
+        changed = set(a.changed_params()) | set(b.changed_params())
+        return [param for param in a.baseline._data if param in changed]
+    if hasattr(a, "_diff_params") and hasattr(b, "_diff_params"):
+        return a._diff_params(b)
+    return list(a._data)
+
+
+def diff(a, b, params=None):
+    """
+    Find the values that differ between two TaxParams instances or views
+    of their values, e.g. BaselineDelta, in all years. The stacked arrays
+    of the parameters are compared all at once instead of value object by
+    value object.
+
+    Arguments:
+        a, b: instances with the same parameters and years.
+        params: parameters to compare. Defaults to the parameters that may
+            differ: the changed parameters of BaselineDeltas of the same
+            baseline or the parameters whose value objects differ, see
+            TaxParams._diff_params.
+
+    Returns: dict of {param: (index, values in a, values in b)} for the
+        parameters with different values. index is a tuple of arrays of the
+        positions of the different values in the stacked arrays, like the
+        output of numpy.nonzero.
+
+    Raises:
+        ValueError: a parameter does not have the same shape in a and b.
+    """
+    if params is None:
+        params = _candidates(a, b)
+    arrays, other_arrays = a.to_policy_arrays(params), b.to_policy_arrays(params)
+    result = {}
+    for param in params:
+        arr, other = np.asarray(arrays[param]), np.asarray(other_arrays[param])
+        if arrays[param] is other_arrays[param]:
+            continue
+        if arr.shape != other.shape:
+            raise ValueError(f"{param} does not have the same shape in a and b.")
+        flat = changed_cells(arr, other)
+        if len(flat):
+            result[param] = (
+                np.unravel_index(flat, arr.shape),
+                arr.ravel()[flat],
+                other.ravel()[flat],
+            )
+    return result
+
+
+class _IndexedStatus(Mapping):
+    """
+    Read-only {param: {"indexed": bool}} of a BaselineDelta, like the _data
+    of a TaxParams instance for the indexed status.
+    """
+
+    def __init__(self, delta):
+        self._delta = delta
+
+    def __getitem__(self, param):
+        indexed = self._delta._indexed.get(param)
+        if indexed is None:
+            indexed = self._delta.baseline._data[param].get("indexed", False)
+        return {"indexed": indexed}
+
+    def __iter__(self):
+        return iter(self._delta.baseline._data)
+
+    def __len__(self):
+        return len(self._delta.baseline._data)
+
+
+class BaselineDelta(ParamsView):
+    """
+    Sparse representation of an adjusted TaxParams instance: only the cells
+    of the stacked arrays that differ from the baseline instance of its
+    class are stored, see TaxParams.from_baseline, with the indexed status
+    and the indexing rates if they differ too. A reform that modifies a few
+    parameters uses a few hundred bytes instead of a copy of the attributes
+    of all parameters, so many reforms can be held in memory.
+
+    Values are read like the values of a TaxParams instance, see
+    ParamsView. The stacked array of a changed parameter is a copy of the
+    baseline array with the stored cells written to it. The arrays of the
+    other parameters are the arrays of the baseline.
+
+    Create it with TaxParams.to_delta. Use to_taxparams to get a TaxParams
+    instance with the same values and adjust to adjust it with a reform.
+    """
+
+    def __init__(self, baseline):
+        self.baseline = baseline
+        self._stateless_label_grid = baseline._stateless_label_grid
+        self.label_grid = baseline._stateless_label_grid
+        self.cells = {}
+        self._full = {}
+        self._indexed = {}
+        self._inflation_rates = None
+        self._wage_growth_rates = None
+        self.fingerprint = baseline._reform_fingerprint
+
+    @classmethod
+    def from_taxparams(cls, taxparams):
+        """
+        Returns: BaselineDelta of taxparams against the baseline instance of
+            its class.
+        """
+        delta = cls(_baseline(type(taxparams)))
+        delta._update(taxparams)
+        return delta
+
+    def _update(self, taxparams):
+        """
+        Replace the stored differences with those of taxparams.
+        """
+        baseline = self.baseline
+        params = taxparams._diff_params(baseline)
+        arrays = taxparams.to_policy_arrays(params)
+        base_arrays = baseline.to_policy_arrays(params)
+        self.cells, self._full, self._indexed = {}, {}, {}
+        for param in params:
+            arr, base = arrays[param], base_arrays[param]
+            indexed = taxparams._data[param].get("indexed", False)
+            if indexed != baseline._data[param].get("indexed", False):
+                self._indexed[param] = indexed
+            if arr is base:
+                continue
+            if (
+                isinstance(arr, np.ndarray)
+                and isinstance(base, np.ndarray)
+                and arr.shape == base.shape
+                and arr.dtype == base.dtype
+                and self._base_index(param) is not None
+            ):
+                flat = changed_cells(arr, base)
+                if len(flat):
+                    self.cells[param] = (
+                        flat.astype(np.int32),
+                        arr.ravel()[flat],
+                    )
+            else:
+                # The values can not be written to the baseline array.
+                self._full[param] = (
+                    arr,
+                    [dict(vo) for vo in taxparams._data[param]["value"]],
+                )
+        self._inflation_rates = self._rates_delta(
+            taxparams.inflation_rates(), baseline.inflation_rates()
+        )
+        self._wage_growth_rates = self._rates_delta(
+            taxparams.wage_growth_rates(), baseline.wage_growth_rates()
+        )
+        self.fingerprint = taxparams._reform_fingerprint
+
+    @staticmethod
+    def _rates_delta(rates, base_rates):
+        if np.array_equal(rates, base_rates):
+            return None
+        return np.array(rates, dtype=float)
+
+    def _base_index(self, param):
+        """
+        Returns: position of each baseline value object of param in its
+            stacked array, see ValueStore.flat_index, or None.
+        """
+        store = ValueStore.from_data(
+            {param: self.baseline._data[param]["value"]},
+            self._stateless_label_grid,
+        )
+        index = store.flat_index(param)
+        return None if index is None else index[0]
+
+    @property
+    def _data(self):
+        return _IndexedStatus(self)
+
+    def changed_params(self):
+        """
+        Returns: list of the parameters whose values or indexed status
+            differ from the baseline.
+        """
+        changed = set(self.cells) | set(self._full) | set(self._indexed)
+        return [param for param in self.baseline._data if param in changed]
+
+    def _stacked_array(self, param):
+        """
+        Returns: stacked array of param and whether its first dimension is
+            the year.
+        """
+        arr, has_year = self.baseline._stacked_array(param)
+        if param in self._full:
+            return self._full[param][0], has_year
+        if param in self.cells:
+            flat, values = self.cells[param]
+            arr = arr.copy()
+            arr.ravel()[flat] = values
+            arr.flags.writeable = False
+        return arr, has_year
+
+    def inflation_rates(self, year=None):
+        rates = self._inflation_rates
+        if rates is None:
+            rates = self.baseline.inflation_rates()
+        if year is not None:
+            return rates[year - self._stateless_label_grid["year"][0]]
+        return list(rates)
+
+    def wage_growth_rates(self, year=None):
+        rates = self._wage_growth_rates
+        if rates is None:
+            rates = self.baseline.wage_growth_rates()
+        if year is not None:
+            return rates[year - self._stateless_label_grid["year"][0]]
+        return list(rates)
+
+    def to_taxparams(self):
+        """
+        Fork the baseline and write the stored differences to it. Only the
+        value objects and attributes of the changed parameters are rebuilt.
+
+        Returns: new TaxParams instance with the values of this delta.
+        """
+        new = self.baseline.fork()
+        changed = self.changed_params()
+        for param in changed:
+            if param in self._full:
+                _, vos = self._full[param]
+                new._data[param]["value"] = [dict(vo) for vo in vos]
+            elif param in self.cells:
+                arr, has_year = self._stacked_array(param)
+                values = arr.ravel()[self._base_index(param)].tolist()
+                new._data[param]["value"] = [
+                    dict(vo, value=value)
+                    for vo, value in zip(self.baseline._data[param]["value"], values)
+                ]
+                new._stacked[param] = (arr, has_year)
+            if param in self._full or param in self.cells:
+                new._shared_values.discard(param)
+            if param in self._indexed:
+                new._data[param]["indexed"] = self._indexed[param]
+        if self._inflation_rates is not None:
+            new._inflation_rates = self._inflation_rates.copy()
+        if self._wage_growth_rates is not None:
+            new._wage_growth_rates = self._wage_growth_rates.copy()
+        new._reform_fingerprint = self.fingerprint
+        if changed:
+            new._set_state(params=changed)
+        return new
+
+    def adjust(self, params_or_path, **kwargs):
+        """
+        Adjust the values of this delta like TaxParams.adjust. The delta is
+        recomputed against the baseline afterwards, so cells that are set
+        back to their baseline values are dropped.
+
+        Returns: the output of TaxParams.adjust.
+        """
+        taxparams = self.to_taxparams()
+        result = taxparams.adjust(params_or_path, **kwargs)
+        self._update(taxparams)
+        return result
+
+    def diff(self, other):
+        """
+        Returns: the values that differ from other, see diff.
+        """
+        return diff(self, other)
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes used by the stored differences.
+        """
+        total = sum(
+            flat.nbytes + values.nbytes for flat, values in self.cells.values()
+        )
+        total += sum(np.asarray(arr).nbytes for arr, _ in self._full.values())
+        for rates in (self._inflation_rates, self._wage_growth_rates):
+            if rates is not None:
+                total += rates.nbytes
+        return total
+
+    def __repr__(self):
+        return (
+            f"BaselineDelta(params={self.changed_params()}, nbytes={self.nbytes})"
+        )
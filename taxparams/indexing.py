@@ -0,0 +1,75 @@
+import numpy as np
+
+
+MAX_VALUE = 9e99
+
+
+def round_values(values):
+    """
+    Round indexed values the same way as ParamTools' extend_func: values are
+    rounded to two decimal places and capped at 9e99.
+    """
+    return np.where(values < MAX_VALUE, np.round(values, 2), MAX_VALUE)
+
+
+def source_index(known):
+    """
+    Find the known cell that each cell of a (years, columns) array is
+    extended from. Cells after the first known cell of a column are extended
+    from the closest known cell before them. Cells before the first known
+    cell of a column are extended from the first known cell.
+
+    Returns: array of year indices with the same shape as known.
+    """
+    years = np.arange(known.shape[0])[:, np.newaxis]
+    ix = np.where(known, years, -1)
+    ix = np.maximum.accumulate(ix, axis=0)
+    first = known.argmax(axis=0)
+    return np.where(ix < 0, first, ix)
+
+
+def extend_values(values, known, rates):
+    """
+    Fill in the unknown cells of a (years, columns) array of indexed
+    parameter values. This gives the same results as extending each value
+    object with ParamTools' extend and extend_func methods:
+
+    - Unknown cells after a known cell are grown from the previous year's
+        value by that year's rate and rounded.
+    - Unknown cells before the first known cell are filled in by shrinking
+        the first known value back to the first year and then growing it
+        forward like the other unknown cells.
+
+    Since the values are rounded every year, the cumulative product of
+    (1 + rate) is computed one year at a time for all columns at once.
+
+    Arguments:
+        values: float array with shape (years, columns). Unknown cells are
+            ignored.
+        known: boolean array marking the known cells of values.
+        rates: float array with shape (years, columns). The value in year i
+            is grown to year i + 1 with rates[i].
+
+    Returns: array with all cells of columns that have a known value filled.
+    """
+    out = values.copy()
+    has_known = known.any(axis=0)
+    first = known.argmax(axis=0)
+
+    # Shrink the first known value back to the first year. This is rare, so
+    # it is done one column at a time with the same scalar operations as
+    # ParamTools.
+    for col in np.flatnonzero(has_known & (first > 0)):
+        value = out[first[col], col]
+        for ix in reversed(range(first[col])):
+            v = value * (1 + rates[ix, col]) ** -1
+            value = np.round(v, 2) if v < MAX_VALUE else MAX_VALUE
+        out[0, col] = value
+
+    for ix in range(1, out.shape[0]):
+        fill = has_known & ~known[ix]
+        if fill.any():
+            out[ix, fill] = round_values(
+                out[ix - 1, fill] * (1 + rates[ix - 1, fill])
+            )
+    return out
@@ -0,0 +1,184 @@
+from collections import deque
+import concurrent.futures
+import os
+
+import numpy as np
+import paramtools as pt
+
+
+def _init_worker(cls, shared_baseline):
+    """
+    Build the baseline instance of cls once per worker process. Workers
+    that are forked from a process that already built it inherit it. If
+    the baseline was shared with TaxParams.share_baseline, the worker's
+    baseline uses the shared arrays.
+    """
+    cls.from_baseline()
+    if shared_baseline is not None:
+        cls._attach_shared_baseline(shared_baseline)
+
+
+def check_reform(reform):
+    """
+    Check that reform has the shape that adjust expects: a dict of
+    {param: list of value objects} or, for "-indexed" adjustments,
+    {param: bool}. Any scalar value is passed on for adjust to validate.
+
+    Raises:
+        pt.ValidationError: with a message for the reform or for each
+            parameter whose adjustment does not have this shape.
+    """
+    if not isinstance(reform, dict):
+        messages = {"reform": ["The reform must be a dict of adjustments."]}
+        raise pt.ValidationError({"errors": messages}, labels=None)
+    messages = {}
+    for param, values in reform.items():
+        if not isinstance(param, str):
+            messages["reform"] = ["Parameter names must be strings."]
+        elif isinstance(values, list):
+            if not all(isinstance(vo, dict) for vo in values):
+                messages[param] = ["Value objects must be dicts."]
+        elif not isinstance(values, (bool, int, float, str, np.generic)):
+            messages[param] = [
+                "Adjustment must be a list of value objects or a single value."
+            ]
+    if messages:
+        raise pt.ValidationError({"errors": messages}, labels=None)
+
+
+def _adjust_reform(cls, reform, kwargs):
+    """
+    Adjust a fork of cls' baseline with reform. Reforms that do not have the
+    shape that adjust expects are reported like reforms that are not valid,
+    so that one bad reform does not stop a batch. Other exceptions are
+    raised.
+
+    Returns: adjusted instance or a ValidationError if reform is not valid.
+    """
+    taxparams = cls.from_baseline()
+    try:
+        check_reform(reform)
+        taxparams.adjust(reform, **kwargs)
+    except pt.ValidationError as ve:
+        return ve
+    return taxparams
+
+
+def _run_reform(cls, reform, kwargs, result_func):
+    """
+    Adjust a fork of cls' baseline with reform in a worker process.
+
+    Returns: ("ok", result_func(taxparams)) if result_func is set, otherwise
+        ("ok", taxparams). Instances are pickled with only the parameters
+        that differ from the baseline, see TaxParams.__getstate__.
+        ("error", messages, labels) if reform is not valid.
+    """
+    taxparams = _adjust_reform(cls, reform, kwargs)
+    if isinstance(taxparams, pt.ValidationError):
+        return ("error", taxparams.messages, taxparams.labels)
+    if result_func is not None:
+        return ("ok", result_func(taxparams))
+    return ("ok", taxparams)
+
+
+def _result(result):
+    """
+    Convert the result of _run_reform to the result of result_func, a
+    TaxParams instance, or a ValidationError.
+    """
+    if result[0] == "error":
+        _, messages, labels = result
+        return pt.ValidationError(messages, labels)
+    return result[1]
+
+
+def _pending_result(item):
+    """
+    Wait for a pending item of iter_adjust, a future of _run_reform or a
+    ValidationError that is passed through, and convert it with _result.
+    """
+    if isinstance(item, pt.ValidationError):
+        return item
+    return _result(item.result())
+
+
+def iter_adjust(
+    cls, reforms, workers=None, max_pending=None, result_func=None, **kwargs
+):
+    """
+    Adjust forks of cls' baseline with each reform in reforms and yield the
+    results in the same order as reforms. Reforms are read lazily and at
+    most max_pending of them are submitted to the pool at a time, so
+    reforms can be a generator over a large file.
+
+    Reforms that are already ValidationErrors, e.g. lines of a file that
+    could not be parsed, are not adjusted and are yielded in their place.
+    They count towards max_pending like the other reforms.
+
+    Arguments:
+        cls: TaxParams class.
+        reforms: iterable of dicts of adjustments, see check_reform, or
+            ValidationErrors.
+        workers: number of worker processes. Defaults to the number of CPUs.
+            Reforms are adjusted in this process if workers is 1.
+        max_pending: maximum number of reforms that have been submitted but
+            not yielded yet. Defaults to four times the number of workers.
+        result_func: function that is called with each adjusted instance in
+            the worker. Its return value is yielded instead of the instance.
+            It must be picklable.
+        kwargs: passed to adjust.
+
+    Yields: adjusted TaxParams instances or the results of result_func, or
+        ValidationErrors for reforms that are not valid.
+    """
+    # Build the baseline before starting the workers so that forked workers
+    # inherit it.
+    cls.from_baseline()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for reform in reforms:
+            if isinstance(reform, pt.ValidationError):
+                yield reform
+                continue
+            taxparams = _adjust_reform(cls, reform, kwargs)
+            if result_func is None or isinstance(
+                taxparams, pt.ValidationError
+            ):
+                yield taxparams
+            else:
+                yield result_func(taxparams)
+        return
+
+    if max_pending is None:
+        max_pending = 4 * workers
+    pending = deque()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(cls, cls.__dict__.get("_shared_baseline")),
+    ) as executor:
+        for reform in reforms:
+            if len(pending) >= max_pending:
+                yield _pending_result(pending.popleft())
+            if isinstance(reform, pt.ValidationError):
+                pending.append(reform)
+                continue
+            pending.append(
+                executor.submit(
+                    _run_reform, cls, reform, kwargs, result_func
+                )
+            )
+        while pending:
+            yield _pending_result(pending.popleft())
+
+
+def adjust_many(cls, reforms, workers=None, **kwargs):
+    """
+    Adjust forks of cls' baseline with each reform in reforms in a pool of
+    worker processes.
+
+    Returns: list of adjusted TaxParams instances, or ValidationErrors for
+        reforms that are not valid, in the same order as reforms.
+    """
+    return list(iter_adjust(cls, reforms, workers=workers, **kwargs))
@@ -0,0 +1,209 @@
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from taxparams.shm import ALIGNMENT, aligned_layout
+from taxparams.views import ParamsView
+
+
+MAGIC = b"TAXPARAM"
+VERSION = 1
+# Magic bytes followed by the version and the length of the JSON header.
+PREFIX = struct.Struct("<8sIQ")
+
+
+def save_results(path, results, names=None):
+    """
+    Write the parameter values of one or more adjusted TaxParams instances
+    to a columnar file that can be opened with ResultFile.
+
+    The file is a JSON header followed by one array for each parameter with
+    its values in all years for all instances, with shape
+    (number of instances, number of years, *label_dims), and arrays of the
+    indexed status of each parameter and of the indexing rates. Each array
+    starts at a multiple of ALIGNMENT bytes, so it can be memory-mapped
+    without copying. The file is written to a temporary file first and moved
+    to path so that readers never see a partially written file.
+
+    Arguments:
+        path: file to write.
+        results: TaxParams instance or list of instances with the same
+            parameters and years.
+        names: name of each instance. Defaults to their positions.
+    """
+    if not isinstance(results, (list, tuple)):
+        results = [results]
+    if not results:
+        raise ValueError("results must contain at least one instance.")
+    names = [str(i) for i in range(len(results))] if names is None else names
+    if len(names) != len(results):
+        raise ValueError("names must have one name for each result.")
+    first = results[0]
+    params = list(first._data)
+    years = first._stateless_label_grid["year"]
+
+    stacked = [taxparams.to_policy_arrays(params) for taxparams in results]
+    arrays = {}
+    for param in params:
+        shapes = {np.shape(result[param]) for result in stacked}
+        if len(shapes) != 1:
+            raise ValueError(f"{param} does not have the same shape in all results.")
+        arrays[f"values/{param}"] = np.stack([result[param] for result in stacked])
+    arrays["indexed"] = np.array(
+        [
+            [bool(taxparams._data[param].get("indexed", False)) for param in params]
+            for taxparams in results
+        ],
+        dtype=bool,
+    ).reshape(len(results), len(params))
+    arrays["inflation_rates"] = np.array(
+        [taxparams.inflation_rates() for taxparams in results], dtype=float
+    )
+    arrays["wage_growth_rates"] = np.array(
+        [taxparams.wage_growth_rates() for taxparams in results], dtype=float
+    )
+
+    layout, _ = aligned_layout(arrays)
+    header = json.dumps(
+        {
+            "names": list(names),
+            "params": params,
+            "has_year": {
+                param: first._stacked_array(param)[1] for param in params
+            },
+            "label_grid": first._stateless_label_grid,
+            "layout": layout,
+        },
+        default=str,
+    ).encode()
+    start = -(-(PREFIX.size + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+            f.write(header)
+            for name, arr in arrays.items():
+                f.seek(start + layout[name][0])
+                f.write(np.ascontiguousarray(arr).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class ResultFile:
+    """
+    Read-only access to a file written by save_results. The file is
+    memory-mapped. Arrays are views of the mapped file, so opening it does
+    not read the values and only the pages that are accessed are loaded.
+
+    Results are accessed by position or by name and are StoredTaxParams
+    views.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mmap = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, header_size = PREFIX.unpack(
+            self._mmap[: PREFIX.size].tobytes()
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a TaxParams result file.")
+        if version != VERSION:
+            raise ValueError(
+                f"{path} has version {version}. Version {VERSION} is supported."
+            )
+        header = json.loads(
+            self._mmap[PREFIX.size: PREFIX.size + header_size].tobytes()
+        )
+        start = -(-(PREFIX.size + header_size) // ALIGNMENT) * ALIGNMENT
+        self.names = header["names"]
+        self.params = header["params"]
+        self.has_year = header["has_year"]
+        self.label_grid = header["label_grid"]
+        self._positions = {name: ix for ix, name in enumerate(self.names)}
+        self._param_ix = {param: ix for ix, param in enumerate(self.params)}
+        self._arrays = {}
+        for name, (offset, shape, dtype) in header["layout"].items():
+            self._arrays[name] = np.ndarray(
+                tuple(shape),
+                dtype=dtype,
+                buffer=self._mmap,
+                offset=start + offset,
+            )
+
+    def values(self, param):
+        """
+        Returns: read-only array of the values of param in all results, with
+            shape (number of results, number of years, *label_dims).
+        """
+        if param not in self._param_ix:
+            raise KeyError(param)
+        return self._arrays[f"values/{param}"]
+
+    def __getitem__(self, key):
+        """
+        Returns: StoredTaxParams view of a result by position or name.
+        """
+        if isinstance(key, str):
+            key = self._positions[key]
+        elif not -len(self) <= key < len(self):
+            raise IndexError(key)
+        return StoredTaxParams(self, key % len(self))
+
+    def __iter__(self):
+        for ix in range(len(self)):
+            yield StoredTaxParams(self, ix)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f"ResultFile(path={self.path!r}, results={len(self)})"
+
+
+class StoredTaxParams(ParamsView):
+    """
+    Read-only view of one result in a ResultFile with the interface of an
+    adjusted TaxParams instance for reading values, see ParamsView. The
+    arrays are views of the mapped file.
+    """
+
+    def __init__(self, result_file, ix):
+        self._file = result_file
+        self._ix = ix
+        self.name = result_file.names[ix]
+        self._stateless_label_grid = result_file.label_grid
+        self.label_grid = result_file.label_grid
+        indexed = result_file._arrays["indexed"][ix]
+        self._data = {
+            param: {"indexed": bool(indexed[param_ix])}
+            for param_ix, param in enumerate(result_file.params)
+        }
+
+    def _stacked_array(self, param):
+        """
+        Returns: stacked array of param and whether its first dimension is
+            the year.
+        """
+        return self._file.values(param)[self._ix], self._file.has_year[param]
+
+    def inflation_rates(self, year=None):
+        rates = self._file._arrays["inflation_rates"][self._ix]
+        if year is not None:
+            return rates[year - self._stateless_label_grid["year"][0]]
+        return rates
+
+    def wage_growth_rates(self, year=None):
+        rates = self._file._arrays["wage_growth_rates"][self._ix]
+        if year is not None:
+            return rates[year - self._stateless_label_grid["year"][0]]
+        return rates
+
+    def __repr__(self):
+        return f"StoredTaxParams(name={self.name!r})"
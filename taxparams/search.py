@@ -0,0 +1,154 @@
+import bisect
+
+
+def label_key(vo):
+    """
+    Hashable key for the labels of a value object, excluding year.
+    """
+    return tuple(
+        sorted(
+            (label, value)
+            for label, value in vo.items()
+            if label not in ("year", "value")
+        )
+    )
+
+
+class YearIndex:
+    """
+    Year-sorted index of a list of value objects. Range queries on the year
+    label are answered with a bisection instead of a scan over all of the
+    value objects. Value objects are also indexed by the tuple of their
+    other labels so that queries on year and all other labels are
+    bisections too.
+
+    The index stores positions in the list of value objects. It stays valid
+    while value objects are only modified or appended to the list. Call
+    update to index appended value objects. The index must be rebuilt if
+    value objects are removed or re-ordered.
+    """
+
+    def __init__(self, vos):
+        self.vos = vos
+        self.years = []
+        self.positions = []
+        self.has_labels = False
+        self.size = 0
+        self._keys = None
+        self._uniform = True
+        self._by_labels = None
+        self.update()
+
+    def update(self):
+        """
+        Index the value objects that were appended to the list since the
+        last update.
+        """
+        entries = []
+        for pos in range(self.size, len(self.vos)):
+            vo = self.vos[pos]
+            if len(vo) > 1:
+                self.has_labels = True
+            if self._keys is None:
+                self._keys = set(vo)
+            elif self._uniform and vo.keys() != self._keys:
+                self._uniform = False
+            if "year" in vo:
+                entries.append((vo["year"], pos))
+        self.size = len(self.vos)
+        if not entries:
+            return
+        self._by_labels = None
+
+        if not self.years:
+            # Build the index in one pass when it is empty.
+            entries.sort()
+            self.years = [year for year, _ in entries]
+            self.positions = [pos for _, pos in entries]
+        else:
+            for year, pos in entries:
+                ix = bisect.bisect_right(self.years, year)
+                self.years.insert(ix, year)
+                self.positions.insert(ix, pos)
+
+    @property
+    def by_labels(self):
+        """
+        Year-sorted indexes of the value objects for each combination of
+        labels other than year. This is built on first use.
+        """
+        if self._by_labels is None:
+            self._by_labels = {}
+            for year, pos in zip(self.years, self.positions):
+                key = label_key(self.vos[pos])
+                years, positions = self._by_labels.setdefault(key, ([], []))
+                years.append(year)
+                positions.append(pos)
+        return self._by_labels
+
+    @property
+    def label_names(self):
+        """
+        Labels other than year that are used by the value objects.
+        """
+        return set(label for key in self.by_labels for label, _ in key)
+
+    def select(self, op, year, labels=None):
+        """
+        Select value objects by comparing their year to year with op, one of
+        "eq", "gt", "gte", "lt", or "lte". If labels are specified, value
+        objects must also be equal to them. labels must include all labels
+        other than year that are used by the value objects.
+
+        Like paramtools.select, value objects without a year label are not
+        selected unless none of the value objects have labels.
+
+        Returns: value objects in the order of the list.
+        """
+        if self.update_needed:
+            self.update()
+        if not self.has_labels:
+            return list(self.vos)
+        if labels:
+            key = label_key(labels)
+            if key not in self.by_labels:
+                return []
+            years, positions = self.by_labels[key]
+        else:
+            years, positions = self.years, self.positions
+        if op == "eq":
+            lo = bisect.bisect_left(years, year)
+            hi = bisect.bisect_right(years, year)
+        elif op == "gt":
+            lo, hi = bisect.bisect_right(years, year), len(years)
+        elif op == "gte":
+            lo, hi = bisect.bisect_left(years, year), len(years)
+        elif op == "lt":
+            lo, hi = 0, bisect.bisect_left(years, year)
+        elif op == "lte":
+            lo, hi = 0, bisect.bisect_right(years, year)
+        else:
+            raise ValueError(f"Unknown operator: {op}")
+        return [self.vos[pos] for pos in sorted(positions[lo:hi])]
+
+    @property
+    def update_needed(self):
+        return self.size != len(self.vos)
+
+    @property
+    def uniform(self):
+        """
+        True if every value object has the same labels.
+        """
+        if self.update_needed:
+            self.update()
+        return self._uniform
+
+    @property
+    def complete(self):
+        """
+        True if every value object has a year label.
+        """
+        if self.update_needed:
+            self.update()
+        return len(self.years) == len(self.vos)
@@ -0,0 +1,463 @@
+import argparse
+import asyncio
+from collections import deque
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import functools
+import json
+import multiprocessing
+import os
+import time
+import urllib.parse
+
+import numpy as np
+import paramtools as pt
+
+from taxparams import TaxParams
+from taxparams.cache import reform_fingerprint
+from taxparams.cli import load_reform, reform_arrays
+from taxparams.parallel import _init_worker, _result, _run_reform
+
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+# Largest request body that is read, in bytes.
+MAX_BODY_SIZE = 10 * 1024 ** 2
+
+
+def _warm(cls):
+    """
+    Make sure that a worker process has built the baseline instance of cls.
+
+    Returns: process id of the worker.
+    """
+    cls.from_baseline()
+    return os.getpid()
+
+
+def _timed_reform(cls, reform, kwargs, result_func):
+    """
+    Run _run_reform in a worker process and time it.
+
+    Returns: (seconds, result of _run_reform).
+    """
+    start = time.perf_counter()
+    result = _run_reform(cls, reform, kwargs, result_func)
+    return time.perf_counter() - start, result
+
+
+class ServerMetrics:
+    """
+    Counts and latencies of the reforms handled by a ReformServer:
+
+    - requests: reforms that were requested.
+    - coalesced: requests that waited for an identical reform that was
+        already being adjusted instead of adjusting it again.
+    - invalid: requests for reforms that are not valid.
+    - failed: requests that failed with an unexpected exception.
+    - restarts: times the worker pool was replaced after a worker died.
+    - in_flight: reforms that are being adjusted or are waiting for a worker.
+    - queue_depth: reforms that are waiting for a worker.
+
+    Latencies are the time from when a request is received until its result
+    is ready. Adjust times are the time spent in the worker process. Both
+    are kept for the last window requests.
+    """
+
+    COUNTERS = ("requests", "coalesced", "invalid", "failed", "restarts")
+
+    def __init__(self, workers, window=1000):
+        self.workers = workers
+        self.requests = 0
+        self.coalesced = 0
+        self.invalid = 0
+        self.failed = 0
+        self.restarts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latencies = deque(maxlen=window)
+        self.adjust_times = deque(maxlen=window)
+
+    @property
+    def queue_depth(self):
+        return max(self.in_flight - self.workers, 0)
+
+    @staticmethod
+    def summary(times):
+        """
+        Returns: dict of the count, mean, percentiles, and maximum of times
+            in seconds.
+        """
+        if not times:
+            return {"count": 0}
+        times = np.array(times)
+        p50, p90, p99 = np.percentile(times, [50, 90, 99])
+        return {
+            "count": len(times),
+            "mean": float(times.mean()),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "max": float(times.max()),
+        }
+
+    def to_dict(self):
+        """
+        Returns: JSON-serializable dict of the counts and latencies.
+        """
+        result = {counter: getattr(self, counter) for counter in self.COUNTERS}
+        result.update(
+            workers=self.workers,
+            in_flight=self.in_flight,
+            max_in_flight=self.max_in_flight,
+            queue_depth=self.queue_depth,
+            latency=self.summary(self.latencies),
+            adjust_time=self.summary(self.adjust_times),
+        )
+        return result
+
+    def __repr__(self):
+        return f"ServerMetrics({self.to_dict()})"
+
+
+class ReformServer:
+    """
+    Asyncio service that adjusts forks of a warm baseline with reforms in a
+    pool of worker processes and returns the Tax-Calculator compatible
+    arrays of the adjusted parameters, see taxparams.cli.reform_arrays.
+
+    The baseline is built in this process and in each worker when the
+    server starts, so requests only pay for the adjustment. The event loop
+    does not adjust reforms itself. Identical reforms that are requested
+    while one of them is being adjusted share its result. If a worker dies,
+    the reforms that it was adjusting fail and the pool is replaced.
+
+    Requests can be made by calling adjust or over HTTP, see serve:
+
+    - POST /adjust with a reform as the JSON body. Add ?all=true to return
+        all parameters instead of only the modified ones. Responds with
+        {"params": {...}}, or {"errors": {...}} and status 400 if the reform
+        is not valid.
+    - GET /metrics: ServerMetrics.to_dict().
+    - GET /health: {"status": "ok"} once the workers are ready.
+
+    Arguments:
+        cls: TaxParams class.
+        workers: number of worker processes. Defaults to the number of CPUs.
+        max_body_size: largest request body that is read, in bytes.
+        kwargs: passed to adjust.
+    """
+
+    def __init__(
+        self, cls=TaxParams, workers=None, max_body_size=MAX_BODY_SIZE, **kwargs
+    ):
+        self.cls = cls
+        self.workers = workers or os.cpu_count() or 1
+        self.max_body_size = max_body_size
+        self.kwargs = kwargs
+        self.metrics = ServerMetrics(self.workers)
+        self._executor = None
+        self._running = False
+        self._start_lock = asyncio.Lock()
+        self._in_flight = {}
+
+    async def start(self):
+        """
+        Build the baseline and start the worker processes. Each worker
+        builds its baseline before the server accepts requests.
+        """
+        async with self._start_lock:
+            if self._executor is not None:
+                return
+            loop = asyncio.get_running_loop()
+            # Build the baseline before starting the workers so that forked
+            # workers inherit it.
+            await loop.run_in_executor(None, self.cls.from_baseline)
+            mp_context = None
+            if self._running:
+                # The pool is being replaced while connections are open.
+                # Forked workers would inherit their sockets and keep them
+                # open after the server closes them, so the workers are
+                # started from a new process and build their own baseline.
+                mp_context = multiprocessing.get_context(
+                    "forkserver"
+                    if "forkserver" in multiprocessing.get_all_start_methods()
+                    else "spawn"
+                )
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(self.cls, self.cls.__dict__.get("_shared_baseline")),
+            )
+            await asyncio.gather(
+                *(
+                    loop.run_in_executor(executor, _warm, self.cls)
+                    for _ in range(self.workers)
+                )
+            )
+            self._executor = executor
+            self._running = True
+
+    async def _restart(self, executor):
+        """
+        Replace executor, a pool with a worker that died, unless it has been
+        replaced already.
+        """
+        async with self._start_lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.metrics.restarts += 1
+        executor.shutdown(wait=False)
+        await self.start()
+
+    async def close(self):
+        """
+        Shut down the worker processes after the reforms that are being
+        adjusted are done.
+        """
+        self._running = False
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(
+                None, executor.shutdown
+            )
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def adjust(self, reform, all_params=False):
+        """
+        Adjust a fork of the baseline with reform in a worker process.
+
+        Arguments:
+            reform: dict of value objects, the output of read_params.
+            all_params: return all parameters instead of only the parameters
+                that differ from the baseline.
+
+        Returns: dict of {param: nested list of values} or a ValidationError
+            if reform is not valid.
+        """
+        if not self._running:
+            raise RuntimeError("The server has not been started.")
+        start = time.perf_counter()
+        self.metrics.requests += 1
+        key = reform_fingerprint(reform, all_params)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._submit(reform, all_params))
+            self._in_flight[key] = future
+            future.add_done_callback(
+                lambda _: self._in_flight.pop(key, None)
+            )
+        else:
+            self.metrics.coalesced += 1
+        try:
+            # Cancelling one request does not cancel the requests that share
+            # its result.
+            result = await asyncio.shield(future)
+        except Exception:
+            self.metrics.failed += 1
+            raise
+        if isinstance(result, Exception):
+            self.metrics.invalid += 1
+        self.metrics.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def _submit(self, reform, all_params):
+        loop = asyncio.get_running_loop()
+        args = (
+            _timed_reform,
+            self.cls,
+            reform,
+            self.kwargs,
+            functools.partial(reform_arrays, all_params=all_params),
+        )
+        self.metrics.in_flight += 1
+        self.metrics.max_in_flight = max(
+            self.metrics.max_in_flight, self.metrics.in_flight
+        )
+        try:
+            if self._executor is None:
+                # The pool is being replaced.
+                await self.start()
+            executor = self._executor
+            try:
+                future = loop.run_in_executor(executor, *args)
+            except BrokenProcessPool:
+                # A worker died before this reform was submitted.
+                await self._restart(executor)
+                executor = self._executor
+                future = loop.run_in_executor(executor, *args)
+            try:
+                seconds, result = await future
+            except BrokenProcessPool:
+                # A worker died while this reform was waiting or being
+                # adjusted. It may have caused it, so it is not retried.
+                await self._restart(executor)
+                raise
+        finally:
+            self.metrics.in_flight -= 1
+        self.metrics.adjust_times.append(seconds)
+        return _result(result)
+
+    async def handle_request(self, method, target, body=b""):
+        """
+        Route an HTTP request.
+
+        Returns: (status code, JSON-serializable response).
+        """
+        url = urllib.parse.urlsplit(target)
+        if url.path == "/adjust":
+            if method != "POST":
+                return 405, {"error": "Use POST to adjust a reform."}
+            try:
+                reform = load_reform(body or b"null")
+            except pt.ValidationError as ve:
+                return 400, ve.messages
+            query = urllib.parse.parse_qs(url.query)
+            all_params = query.get("all", ["false"])[-1].lower() in (
+                "1",
+                "true",
+            )
+            try:
+                result = await self.adjust(reform, all_params=all_params)
+            except Exception as e:
+                return 500, {"error": f"{type(e).__name__}: {e}"}
+            if isinstance(result, Exception):
+                return 400, result.messages
+            return 200, {"params": result}
+        if url.path == "/metrics" and method == "GET":
+            return 200, self.metrics.to_dict()
+        if url.path == "/health" and method == "GET":
+            if self._executor is None:
+                return 500, {"status": "starting"}
+            return 200, {"status": "ok", "workers": self.workers}
+        return 404, {"error": f"{method} {url.path} not found."}
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Serve HTTP/1.1 requests on a connection until the client closes it
+        or asks to close it.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = (
+                    request_line.decode("latin-1").split()
+                )
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length < 0:
+                    break
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                if length > self.max_body_size:
+                    # The body is not read, so the connection can not be
+                    # reused.
+                    keep_alive = False
+                    status, response = 413, {
+                        "error": (
+                            f"The request body is larger than "
+                            f"{self.max_body_size} bytes."
+                        )
+                    }
+                else:
+                    body = await reader.readexactly(length)
+                    status, response = await self.handle_request(
+                        method, target, body
+                    )
+                data = json.dumps(response, default=str).encode()
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(data)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"
+                        "\r\n\r\n"
+                    ).encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # The client disconnected or sent a malformed request.
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        """
+        Start the workers and listen for HTTP requests on host and port.
+
+        Returns: asyncio.Server. Use its sockets to find the port if port is
+            0.
+        """
+        await self.start()
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+
+async def _serve(host, port, workers):
+    async with ReformServer(workers=workers) as server:
+        http_server = await server.serve(host, port)
+        for sock in http_server.sockets:
+            host, port = sock.getsockname()[:2]
+            print(f"Serving on http://{host}:{port}")
+        async with http_server:
+            await http_server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="taxparams-server",
+        description=(
+            "Serve reform adjustments over HTTP. POST a reform to /adjust to "
+            "get the arrays of the modified parameters or the validation "
+            "errors. GET /metrics for request counts and latencies."
+        ),
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="Defaults to 127.0.0.1."
+    )
+    parser.add_argument(
+        "--port", type=int, default=8000, help="Defaults to 8000."
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+# Offsets of the arrays in the block are aligned to this many bytes.
+ALIGNMENT = 64
+
+
+def _attach(name):
+    """
+    Attach to an existing block of shared memory. The block is not
+    registered with the resource tracker of this process, which would
+    otherwise unlink it when this process exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the block.
+        shm = shared_memory.SharedMemory(name=name)
+    # Processes that are started by multiprocessing share the resource
+    # tracker of their parent, where the creator registered the block, so
+    # registering it again does nothing. Other processes start their own
+    # resource tracker, which would unlink the block when they exit.
+    if multiprocessing.parent_process() is None:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def aligned_layout(arrays):
+    """
+    Position the arrays, a dict of {name: array}, one after the other in a
+    block of memory. Each array starts at a multiple of ALIGNMENT bytes.
+
+    Returns: layout, a dict of {name: (offset, shape, dtype string)}, and
+        the size of the block.
+    """
+    layout = {}
+    size = 0
+    for name, arr in arrays.items():
+        size = -(-size // ALIGNMENT) * ALIGNMENT
+        layout[name] = (size, arr.shape, arr.dtype.str)
+        size += arr.nbytes
+    return layout, size
+
+
+class SharedArrays:
+    """
+    Read-only NumPy arrays stored in one block of shared memory. An
+    instance is pickled as the name of the block and the position, shape,
+    and type of each array in it, so passing it to another process attaches
+    that process to the same memory without copying the arrays.
+
+    The process that creates the block should call unlink when the other
+    processes are done with it.
+    """
+
+    def __init__(self, shm, layout):
+        self._shm = shm
+        self.layout = layout
+        self._arrays = None
+
+    @classmethod
+    def create(cls, arrays):
+        """
+        Copy arrays, a dict of {name: array}, to a new block of shared
+        memory.
+        """
+        layout, size = aligned_layout(arrays)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shared = cls(shm, layout)
+        for name, arr in arrays.items():
+            offset, shape, dtype = layout[name]
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[
+                ...
+            ] = arr
+        return shared
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def nbytes(self):
+        return self._shm.size
+
+    def arrays(self):
+        """
+        Returns: dict of {name: read-only array backed by the shared
+            memory}.
+        """
+        if self._arrays is None:
+            arrays = {}
+            for name, (offset, shape, dtype) in self.layout.items():
+                arr = np.ndarray(
+                    shape, dtype=dtype, buffer=self._shm.buf, offset=offset
+                )
+                arr.flags.writeable = False
+                arrays[name] = arr
+            self._arrays = arrays
+        return self._arrays
+
+    def unlink(self):
+        """
+        Remove the name of the block of shared memory. Processes that are
+        attached to it can keep using their arrays. The memory is freed when
+        all of them have exited or dropped their arrays.
+        """
+        self._shm.unlink()
+
+    def __getstate__(self):
+        return {"name": self._shm.name, "layout": self.layout}
+
+    def __setstate__(self, state):
+        self.__init__(_attach(state["name"]), state["layout"])
+
+    def __repr__(self):
+        return (
+            f"SharedArrays(name={self.name!r}, arrays={len(self.layout)}, "
+            f"nbytes={self.nbytes})"
+        )
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import time
+
+
+class AdjustStats:
+    """
+    Wall time of each phase of a TaxParams.adjust call and counts of the work
+    that it did:
+
+    - adjust_calls: calls to paramtools.Parameters._adjust, including the
+        ones made by extend and by _adjust itself.
+    - extend_calls: calls to TaxParams.extend.
+    - value_objects: value objects that were updated or deleted.
+    - params_reset: parameters whose attributes were reset after their
+        values were re-extended.
+
+    Phases are marked with phase(name), which ends the previous phase.
+    """
+
+    COUNTERS = ("adjust_calls", "extend_calls", "value_objects", "params_reset")
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.adjust_calls = 0
+        self.extend_calls = 0
+        self.value_objects = 0
+        self.params_reset = 0
+        self.cache_hit = False
+        self.error = None
+        self.total = None
+        self._phase = None
+        self._phase_start = None
+        self._start = time.perf_counter()
+
+    def phase(self, name):
+        """
+        End the current phase and start timing phase name. Time spent in
+        a phase that is entered more than once is added up.
+        """
+        now = time.perf_counter()
+        if self._phase is not None:
+            self.phases[self._phase] = (
+                self.phases.get(self._phase, 0) + now - self._phase_start
+            )
+        self._phase = name
+        self._phase_start = now
+
+    def count(self, counter, n=1):
+        setattr(self, counter, getattr(self, counter) + n)
+
+    def stop(self, error=None):
+        """
+        End the current phase and record the total time and, if adjust
+        failed, the name of the exception that was raised.
+        """
+        self.phase(None)
+        self.total = time.perf_counter() - self._start
+        if error is not None:
+            self.error = type(error).__name__
+
+    def to_dict(self):
+        """
+        Returns: JSON-serializable dict of the timings and counts.
+        """
+        result = {counter: getattr(self, counter) for counter in self.COUNTERS}
+        result.update(
+            phases=dict(self.phases),
+            cache_hit=self.cache_hit,
+            error=self.error,
+            total=self.total,
+        )
+        return result
+
+    def __repr__(self):
+        return f"AdjustStats({self.to_dict()})"
+
+
+class NullStats:
+    """
+    Stand-in for AdjustStats when statistics are turned off. All methods
+    are no-ops.
+    """
+
+    def phase(self, name):
+        pass
+
+    def count(self, counter, n=1):
+        pass
+
+    def stop(self, error=None):
+        pass
+
+
+NULL_STATS = NullStats()
@@ -0,0 +1,192 @@
+import numpy as np
+
+
+# Types of values that can be stored in a typed array. Values of the Python
+# types are converted back with tolist, values of the NumPy types are
+# returned as NumPy scalars.
+NATIVE_TYPES = (bool, int, float, str)
+NUMPY_TYPES = (np.bool_, np.int64, np.float64)
+
+
+def _code_dtype(n):
+    """
+    Smallest integer type that can hold the codes of n label values.
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if n <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class ValueStore:
+    """
+    Columnar store of parameter values. The value objects of each parameter
+    are stored as an integer code for each label, its position in the label
+    grid, and a typed NumPy array of values instead of as a list of dicts.
+    This uses a small fraction of the memory of the value objects.
+
+    TaxParams uses it for the copies of values that it keeps besides the
+    live values: snapshots, reform cache entries, and pickled instances,
+    including the results that workers send back. The live _data of an
+    instance keeps its lists of dicts because ParamTools adjusts, validates,
+    and selects them directly, so a working or forked instance uses as much
+    memory as before.
+
+    Value objects are converted back to dicts with value_objects. They have
+    the same labels, values, and order as the value objects that were stored.
+    Parameters with value objects that can not be encoded, e.g. values of
+    mixed types, keys in different orders, or label values that are not in
+    the label grid, are stored as copies of the value objects.
+    """
+
+    def __init__(self, label_grid):
+        self.label_grid = label_grid
+        self._positions = {
+            label: {value: ix for ix, value in enumerate(values)}
+            for label, values in label_grid.items()
+        }
+        self._columns = {}
+
+    @classmethod
+    def from_data(cls, data, label_grid):
+        """
+        Create a store from a dict of {param: list of value objects}.
+        """
+        store = cls(label_grid)
+        for param, vos in data.items():
+            store[param] = vos
+        return store
+
+    def __setitem__(self, param, vos):
+        self._columns[param] = self._encode(vos)
+
+    def _encode(self, vos):
+        """
+        Returns: (keys, codes, values, native) or
+            (None, None, copies of vos, None) if vos can not be encoded.
+        """
+        if not vos:
+            return ((), np.zeros((0, 0), dtype=np.int8), np.array([]), True)
+        keys = tuple(vos[0])
+        # Value objects are rebuilt with the keys of the first one, so they
+        # must all have the same keys in the same order.
+        if "value" not in keys or any(tuple(vo) != keys for vo in vos):
+            return self._copies(vos)
+        labels = [key for key in keys if key != "value"]
+        try:
+            codes = np.array(
+                [
+                    [self._positions[label][vo[label]] for vo in vos]
+                    for label in labels
+                ],
+                dtype=np.int64,
+            ).reshape(len(labels), len(vos))
+        except (KeyError, TypeError):
+            return self._copies(vos)
+        values = [vo["value"] for vo in vos]
+        value_type = type(values[0])
+        if (
+            value_type not in NATIVE_TYPES + NUMPY_TYPES
+            or any(type(value) is not value_type for value in values)
+        ):
+            return self._copies(vos)
+        max_code = max([len(self.label_grid[label]) for label in labels] or [0])
+        return (
+            keys,
+            codes.astype(_code_dtype(max_code)),
+            np.array(values, dtype=object if value_type is str else value_type),
+            value_type in NATIVE_TYPES,
+        )
+
+    @staticmethod
+    def _copies(vos):
+        return (None, None, [dict(vo) for vo in vos], None)
+
+    def value_objects(self, param):
+        """
+        Returns: new list of the value objects of param.
+        """
+        keys, codes, values, native = self._columns[param]
+        if keys is None:
+            return [dict(vo) for vo in values]
+        columns = iter(codes.tolist())
+        key_values = [
+            (values.tolist() if native else values)
+            if key == "value"
+            else [self.label_grid[key][code] for code in next(columns)]
+            for key in keys
+        ]
+        return [dict(zip(keys, row)) for row in zip(*key_values)]
+
+    def flat_index(self, param):
+        """
+        Position of each value object of param in a dense array with one
+        dimension for each of its labels, in the order of the label grid.
+
+        Returns: (array of flat positions, shape), or None if param is stored
+            as copies, has no labels, or its value objects do not cover each
+            point of the label grid exactly once.
+        """
+        keys, codes, values, _ = self._columns[param]
+        if keys is None or len(keys) < 2:
+            return None
+        labels = [key for key in keys if key != "value"]
+        grid_order = list(self.label_grid)
+        order = sorted(range(len(labels)), key=lambda i: grid_order.index(labels[i]))
+        shape = tuple(len(self.label_grid[labels[i]]) for i in order)
+        size = int(np.prod(shape))
+        if len(values) != size:
+            return None
+        flat = np.ravel_multi_index(codes[order].astype(np.intp), shape)
+        if (np.bincount(flat, minlength=size) != 1).any():
+            return None
+        return flat, shape
+
+    def to_array(self, param, dtype=None):
+        """
+        Dense array of the values of param with one dimension for each of its
+        labels, in the order of the label grid, like
+        paramtools.Parameters.to_array without a state. The values are
+        scattered into the array by their label codes all at once.
+
+        Returns: array, or None if param can not be indexed, see flat_index.
+        """
+        index = self.flat_index(param)
+        if index is None:
+            return None
+        flat, shape = index
+        values = self._columns[param][2]
+        arr = np.empty(len(flat), dtype=dtype or values.dtype)
+        arr[flat] = values
+        return arr.reshape(shape)
+
+    def to_data(self):
+        """
+        Returns: dict of {param: list of value objects}.
+        """
+        return {param: self.value_objects(param) for param in self._columns}
+
+    @property
+    def nbytes(self):
+        """
+        Estimated number of bytes used by the encoded values.
+        """
+        total = 0
+        for keys, codes, values, _ in self._columns.values():
+            if keys is None:
+                total += sum(64 + 100 * len(vo) for vo in values)
+            else:
+                total += codes.nbytes + values.nbytes
+        return total
+
+    def __getitem__(self, param):
+        return self.value_objects(param)
+
+    def __contains__(self, param):
+        return param in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
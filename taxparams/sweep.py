@@ -0,0 +1,108 @@
+import numpy as np
+import paramtools as pt
+
+from taxparams.indexing import extend_values
+
+
+def cpi_offset_paths(taxparams, scenarios, **kwargs):
+    """
+    Apply each CPI_offset adjustment in scenarios to a fork of taxparams
+    with paramtools.Parameters.adjust, which validates it and extends it
+    to all years. The fork is rolled back after each scenario.
+
+    Returns: (N, years) array of CPI_offset values and the first year that
+        is adjusted in each scenario.
+
+    Raises:
+        paramtools.ValidationError if a scenario is not valid.
+    """
+    fork = taxparams.fork()
+    fork.array_first = False
+    years = fork._stateless_label_grid["year"]
+    checkpoint = fork.checkpoint()
+    paths = np.zeros((len(scenarios), len(years)))
+    min_years = []
+    for n, scenario in enumerate(scenarios):
+        adj = pt.Parameters.adjust(fork, {"CPI_offset": scenario}, **kwargs)
+        min_years.append(min(vo["year"] for vo in adj["CPI_offset"]))
+        for vo in fork._data["CPI_offset"]["value"]:
+            paths[n, years.index(vo["year"])] = vo["value"]
+        fork.rollback(checkpoint)
+    return paths, min_years
+
+
+def cpi_offset_sweep(taxparams, scenarios, **kwargs):
+    """
+    Compute the values of the indexed parameters of taxparams after it is
+    adjusted with each CPI_offset adjustment in scenarios. The result for
+    each scenario is the same as that of
+    taxparams.adjust({"CPI_offset": scenario}), but taxparams is not
+    modified and the values of all parameters in all scenarios are
+    re-extended in one pass:
+
+    1. The inflation rates of each scenario are the current inflation rates
+        plus the scenario's CPI_offset values, starting in the first year
+        that it adjusts.
+    2. The values of the indexed parameters, except for those in
+        WAGE_INDEXED_PARAMS, are kept until the later of that year and the
+        last known year and are extended with the scenario's rates after
+        it. The wage indexed parameters do not depend on CPI_offset.
+
+    The re-extended values are not validated again.
+
+    Arguments:
+        scenarios: list of CPI_offset adjustments, i.e. lists of value
+            objects.
+        kwargs: passed to paramtools.Parameters.adjust when the CPI_offset
+            adjustments are validated.
+
+    Returns: dict of {param: array} for CPI_offset and the indexed
+        parameters. Each array has the shape of the parameter's stacked
+        array with a leading scenario dimension.
+    """
+    scenarios = list(scenarios)
+    paths, min_years = cpi_offset_paths(taxparams, scenarios, **kwargs)
+    years = np.array(taxparams._stateless_label_grid["year"])
+    num_scenarios = len(scenarios)
+
+    base_rates = np.asarray(taxparams.inflation_rates())
+    adjusted = years >= np.array(min_years)[:, np.newaxis]
+    rates = np.where(adjusted, base_rates + paths, base_rates)
+    cuts = np.maximum(np.array(min_years), taxparams._last_known_year)
+
+    params = [
+        param
+        for param, data in taxparams._data.items()
+        if data.get("indexed", False) and param != "CPI_offset"
+    ]
+    result = {"CPI_offset": paths}
+    columns, values, param_rates, known = [], [], [], []
+    for param in params:
+        arr, has_year = taxparams._stacked_array(param)
+        if param in taxparams.WAGE_INDEXED_PARAMS or not has_year:
+            result[param] = np.broadcast_to(arr, (num_scenarios,) + arr.shape)
+            continue
+        cols = arr.reshape(len(years), -1)
+        columns.append((param, arr.shape, cols.shape[1]))
+        # Columns are ordered by scenario, then by the parameter's labels.
+        values.append(np.tile(cols, num_scenarios))
+        param_rates.append(np.repeat(rates.T, cols.shape[1], axis=1))
+        known.append(
+            np.repeat(years[:, np.newaxis] <= cuts, cols.shape[1], axis=1)
+        )
+
+    if columns:
+        extended = extend_values(
+            np.hstack(values), np.hstack(known), np.hstack(param_rates)
+        )
+        start = 0
+        for param, shape, num_cols in columns:
+            stop = start + num_cols * num_scenarios
+            result[param] = (
+                extended[:, start:stop]
+                .reshape(len(years), num_scenarios, num_cols)
+                .transpose(1, 0, 2)
+                .reshape((num_scenarios,) + shape)
+            )
+            start = stop
+    return result
@@ -1,11 +1,33 @@
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
 import copy
+import json
+import os
+import pickle
+import re
+import subprocess
+import sys
 
 import numpy as np
+import paramtools as pt
+from paramtools.select import select_eq, select_gt, select_lt
 import pytest
 
 import taxcalc
 
-from taxparams import TaxParams
+from taxparams import (
+    BaselineDelta,
+    ReformCache,
+    ResultFile,
+    TaxParams,
+    cli,
+    save_results,
+    server,
+    utils,
+)
+from taxparams.parallel import iter_adjust
+from taxparams.search import YearIndex
+from taxparams.store import ValueStore
 
 
 def cmp_with_taxcalc_values(taxparams, pol=None):
@@ -81,6 +103,33 @@ def test_adj_indexed_status_beginning(taxparams):
     cmp_with_taxcalc_values(taxparams, pol)
 
 
+def test_adj_indexed_status_coerced(taxparams):
+    # -indexed values are deserialized like ParamTools booleans.
+    ref = taxparams.fork()
+    ref.adjust({"EITC_c-indexed": [{"year": 2020, "value": False}]})
+    for value in (0, np.bool_(False), "false"):
+        tp = taxparams.fork()
+        adj = tp.adjust({"EITC_c-indexed": [{"year": 2020, "value": value}]})
+        assert adj["EITC_c-indexed"] == [{"year": 2020, "value": False}]
+        assert tp._data["EITC_c"]["indexed"] is False
+        np.testing.assert_equal(tp.EITC_c, ref.EITC_c)
+    tp = taxparams.fork()
+    tp.adjust({"EITC_c-indexed": 0})
+    assert tp._data["EITC_c"]["indexed"] is False
+
+    with pytest.raises(pt.ValidationError) as excinfo:
+        taxparams.fork().adjust(
+            {"CPI_offset-indexed": True, "EITC_c-indexed": 5}
+        )
+    assert excinfo.value.messages["errors"] == {
+        "CPI_offset-indexed": ["Parameter CPI_offset is not indexable."],
+        "EITC_c-indexed": [
+            "Index adjustment must be a boolean or a list of value objects "
+            "with a year from 2013 to 2030 and a boolean value."
+        ],
+    }
+
+
 @pytest.mark.parametrize("year", [2014, 2016, 2018, 2022, 2025])
 def test_adj_indexed_status_and_param_value(taxparams, year):
     pol = taxcalc.Policy()
@@ -218,3 +267,1098 @@ def test_adj_CPI_offset_and_index_status():
     pol.implement_reform({"CTC_c-indexed": {2020: True}, "CPI_offset": {2020: -0.005}})
 
     cmp_with_taxcalc_values(taxparams, pol)
+
+
+def test_defaults_cache(tmp_path, monkeypatch):
+    defaults = utils.load_defaults(cache_dir=str(tmp_path))
+    cached = list(tmp_path.iterdir())
+    assert len(cached) == 1
+    assert cached[0].name == (
+        f"{utils.defaults_cache_prefix()}{utils.defaults_cache_key()}.npz"
+    )
+    assert utils.load_defaults(cache_dir=str(tmp_path)) == defaults
+    assert defaults == utils.convert_defaults()
+    assert cached[0].stat().st_size < os.path.getsize(utils.DEFAULTS_PATH)
+
+    # Corrupted cache files are rebuilt and stale ones of the same taxcalc
+    # version are removed. The files of other versions are kept.
+    stale = tmp_path / f"{utils.defaults_cache_prefix()}stale.npz"
+    stale.write_text("")
+    other = tmp_path / "defaults-other.version-key.npz"
+    other.write_text("{}")
+    cached[0].write_text("not an npz file")
+    assert utils.load_defaults(cache_dir=str(tmp_path)) == defaults
+    assert sorted(tmp_path.iterdir()) == sorted([cached[0], other])
+
+    # The temporary file is removed if the cache can not be written.
+    def fail(*args, **kwargs):
+        raise TypeError("not serializable")
+
+    cached[0].unlink()
+    with monkeypatch.context() as m:
+        m.setattr(utils.np, "savez", fail)
+        assert utils.load_defaults(cache_dir=str(tmp_path)) == defaults
+    assert list(tmp_path.iterdir()) == [other]
+
+    # The key changes with the contents of the defaults file, even if its
+    # size and modification time do not change.
+    copied = tmp_path / "policy_current_law.json"
+    contents = open(utils.DEFAULTS_PATH, "rb").read()
+    copied.write_bytes(contents)
+    os.utime(copied, ns=(0, 0))
+    monkeypatch.setattr(utils, "DEFAULTS_PATH", str(copied))
+    key = utils.defaults_cache_key()
+    os.utime(copied, ns=(1, 1))
+    assert utils.defaults_cache_key() == key
+    ix = re.search(rb"\d", contents).start()
+    digit = b"1" if contents[ix:ix + 1] != b"1" else b"2"
+    copied.write_bytes(contents[:ix] + digit + contents[ix + 1:])
+    os.utime(copied, ns=(0, 0))
+    assert utils.defaults_cache_key() != key
+
+    # The cache is off unless a directory is set.
+    monkeypatch.setattr(utils, "CACHE_DIR", "")
+    assert utils.load_defaults() == defaults
+    assert sorted(tmp_path.iterdir()) == sorted([copied, other])
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys, taxparams; "
+        "assert 'taxcalc' not in sys.modules; "
+        "assert taxparams.TaxParams.__dict__['defaults'].value is None"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_fork(taxparams):
+    fork = taxparams.fork()
+    fork.adjust(
+        {
+            "CPI_offset": [{"year": 2020, "value": -0.005}],
+            "CTC_c-indexed": [{"year": 2020, "value": True}],
+        }
+    )
+    pol = taxcalc.Policy()
+    pol.implement_reform(
+        {"CTC_c-indexed": {2020: True}, "CPI_offset": {2020: -0.005}}
+    )
+    cmp_with_taxcalc_values(fork, pol)
+    # The instance that was forked is not affected by the adjustment and
+    # adjusting it does not affect the fork.
+    cmp_with_taxcalc_values(taxparams)
+    taxparams.adjust({"EITC_c-indexed": False})
+    cmp_with_taxcalc_values(fork, pol)
+
+
+def test_from_baseline():
+    taxparams = TaxParams.from_baseline()
+    taxparams.adjust({"II_em": [{"year": 2020, "value": 9000}]})
+    pol = taxcalc.Policy()
+    pol.implement_reform({"II_em": {2020: 9000}})
+    cmp_with_taxcalc_values(taxparams, pol)
+    cmp_with_taxcalc_values(TaxParams.from_baseline())
+
+
+def test_index_rates_cache():
+    taxparams1 = TaxParams()
+    hits = utils.index_rates.cache_info().hits
+    taxparams2 = TaxParams()
+    assert utils.index_rates.cache_info().hits > hits
+    assert taxparams1._gfactors is taxparams2._gfactors
+    assert taxparams1._wage_growth_rates is taxparams2._wage_growth_rates
+    assert taxparams1._inflation_rates is not taxparams2._inflation_rates
+    np.testing.assert_equal(
+        taxparams1.inflation_rates(), taxparams2.inflation_rates()
+    )
+    assert not taxparams1._wage_growth_rates.flags.writeable
+    # The public methods return new lists that callers can modify.
+    for rates in (
+        taxparams1.inflation_rates(), taxparams1.wage_growth_rates()
+    ):
+        assert isinstance(rates, list)
+        rates[0] = 1.0
+        rates.append(1.0)
+    np.testing.assert_equal(
+        taxparams1.inflation_rates(), taxparams2.inflation_rates()
+    )
+    np.testing.assert_equal(
+        taxparams1.wage_growth_rates(), taxparams2.wage_growth_rates()
+    )
+
+
+def test_extend_matches_paramtools(taxparams):
+    params = ["II_em", "STD", "EITC_c", "AMT_em", "SS_Earnings_c", "II_rt1"]
+    ref = taxparams.fork()
+    for tp in (taxparams, ref):
+        # Delete values before 2014 and after 2016 so that values are
+        # extended backwards and forwards.
+        tp.label_to_extend = None
+        tp.array_first = False
+        for param in params:
+            vos = tp.select_gt(param, True, year=2016)
+            vos += tp.select_lt(param, True, year=2014)
+            pt.Parameters.adjust(
+                tp, {param: [dict(vo, value=None) for vo in vos]}
+            )
+        tp.label_to_extend = "year"
+        tp.array_first = True
+
+    taxparams.extend(params=params)
+    pt.Parameters.extend(ref, params=params)
+    for param in params:
+        np.testing.assert_equal(getattr(taxparams, param), getattr(ref, param))
+
+
+def test_delete_after(taxparams):
+    fork = taxparams.fork()
+    fork._delete_after({"II_em": 2016, "STD": 2020})
+    assert max(vo["year"] for vo in fork._data["II_em"]["value"]) == 2016
+    assert max(vo["year"] for vo in fork._data["STD"]["value"]) == 2020
+    assert len(fork.select_eq("STD", True, year=2020)) == 5
+    assert max(vo["year"] for vo in taxparams._data["II_em"]["value"]) == 2030
+
+
+def test_year_index(taxparams):
+    taxparams.adjust(
+        {
+            "EITC_c": [{"year": 2020, "EIC": "1kid", "value": 10001}],
+            "EITC_c-indexed": [{"year": 2022, "value": False}],
+        }
+    )
+    vos = taxparams._data["EITC_c"]["value"]
+
+    def ids(vos):
+        return sorted(map(id, vos))
+
+    for year in (2012, 2013, 2020, 2030, 2031):
+        for op, select in (
+            ("eq", select_eq),
+            ("gt", select_gt),
+            ("lt", select_lt),
+        ):
+            expected = select(vos, True, {"year": year})
+            assert ids(getattr(taxparams, f"select_{op}")(
+                "EITC_c", True, year=year
+            )) == ids(expected)
+
+        expected = select_eq(vos, True, {"year": year, "EIC": "1kid"})
+        assert ids(
+            taxparams.select_eq("EITC_c", True, year=year, EIC="1kid")
+        ) == ids(expected)
+
+    # Appended value objects are picked up by the index.
+    index = YearIndex([{"year": 2014, "value": 1}])
+    index.vos.append({"year": 2013, "value": 2})
+    assert index.select("lt", 2014) == [{"year": 2013, "value": 2}]
+    # Value objects without labels are always selected.
+    assert YearIndex([{"value": 1}]).select("gt", 2020) == [{"value": 1}]
+
+
+def test_year_index_fallback(taxparams):
+    def ids(vos):
+        return sorted(map(id, vos))
+
+    queries = [
+        {"year": 2014},
+        {"year": 2014, "EIC": "1kid"},
+        {"year": 2013, "EIC": "0kids"},
+        {"year": 2014, "MARS": "single"},
+    ]
+    selects = [("eq", select_eq), ("gt", select_gt), ("lt", select_lt)]
+    # exact_match=False is answered like ParamTools.
+    vos = taxparams._data["EITC_c"]["value"]
+    for labels in queries:
+        for op, select in selects:
+            assert ids(
+                getattr(taxparams, f"select_{op}")("EITC_c", False, **labels)
+            ) == ids(select(vos, False, labels))
+
+    # So are parameters whose value objects have different labels.
+    vos = [
+        {"year": 2013, "EIC": "0kids", "value": 1.0},
+        {"year": 2014, "value": 2.0},
+        {"year": 2015, "EIC": "1kid", "value": 3.0},
+        {"year": 2014, "EIC": "1kid", "value": 4.0},
+    ]
+    taxparams._data["EITC_c"]["value"] = vos
+    taxparams._search_trees.pop("EITC_c", None)
+    assert not taxparams._year_index("EITC_c").uniform
+    for labels in queries[:3]:
+        for exact_match in (True, False):
+            for op, select in selects:
+                assert ids(
+                    getattr(taxparams, f"select_{op}")(
+                        "EITC_c", exact_match, **labels
+                    )
+                ) == ids(select(vos, exact_match, labels))
+
+
+def test_reform_cache():
+    adj = {
+        "CPI_offset": [{"year": 2020, "value": -0.005}],
+        "CTC_c-indexed": [{"year": 2020, "value": True}],
+    }
+    ref = TaxParams.from_baseline()
+    ref.adjust(adj)
+
+    cache = ReformCache(maxsize=1)
+    taxparams1 = TaxParams.from_baseline()
+    taxparams1.reform_cache = cache
+    taxparams1.adjust(adj)
+    # Modifying the adjusted instance does not modify the cached result.
+    taxparams1.adjust({"CTC_c": [{"year": 2022, "value": 0}]})
+    assert cache.cache_info()[:3] == (0, 2, 1)
+
+    taxparams2 = TaxParams.from_baseline()
+    taxparams2.reform_cache = cache
+    taxparams2.adjust({"CTC_c": [{"year": 2022, "value": 0}]})
+    taxparams2 = TaxParams.from_baseline()
+    taxparams2.reform_cache = cache
+    taxparams2.adjust(adj)
+    assert cache.cache_info()[:3] == (0, 4, 3)
+    taxparams3 = TaxParams.from_baseline()
+    taxparams3.reform_cache = cache
+    taxparams3.adjust(adj)
+    assert cache.cache_info()[:3] == (1, 4, 3)
+
+    for taxparams in (taxparams2, taxparams3):
+        assert taxparams._data["CTC_c"]["indexed"]
+        np.testing.assert_equal(
+            taxparams.inflation_rates(), ref.inflation_rates()
+        )
+        for param in ref._data:
+            np.testing.assert_equal(getattr(taxparams, param), getattr(ref, param))
+    # Values that were adjusted before the reform are part of the key.
+    taxparams1.adjust(adj)
+    assert cache.cache_info()[:3] == (1, 5, 4)
+
+
+def test_reform_cache_lazy_arrays():
+    adj = {"STD": [{"year": 2020, "MARS": "single", "value": 9000}]}
+    ref = TaxParams.from_baseline()
+    ref.adjust(adj)
+
+    cache = ReformCache()
+    lazy = TaxParams.from_baseline()
+    lazy.lazy_arrays = True
+    lazy.reform_cache = cache
+    lazy.adjust(adj)
+    eager = TaxParams.from_baseline()
+    eager.reform_cache = cache
+    eager.adjust(adj)
+    # Lazy and eager instances do not share cache entries.
+    assert cache.cache_info()[:2] == (0, 2)
+    np.testing.assert_equal(eager.__dict__["STD"], ref.STD)
+
+    # The attributes that are missing from a snapshot of a lazy instance
+    # are rebuilt when it is restored to an eager instance.
+    assert "STD" not in lazy.__dict__
+    snapshot = lazy._snapshot(["STD"])
+    eager = TaxParams.from_baseline()
+    eager._restore(snapshot)
+    np.testing.assert_equal(eager.__dict__["STD"], ref.STD)
+    np.testing.assert_equal(lazy.STD, ref.STD)
+
+
+def test_pickle():
+    taxparams = TaxParams.from_baseline()
+    taxparams.adjust(
+        {
+            "CPI_offset": [{"year": 2020, "value": -0.005}],
+            "CTC_c-indexed": [{"year": 2020, "value": True}],
+        }
+    )
+    payload = pickle.dumps(taxparams)
+    assert len(payload) < len(pickle.dumps(taxparams._data)) / 4
+    result = pickle.loads(payload)
+    assert result._data == taxparams._data
+    np.testing.assert_equal(
+        result.inflation_rates(), taxparams.inflation_rates()
+    )
+    for param in taxparams._data:
+        np.testing.assert_equal(
+            getattr(result, param), getattr(taxparams, param)
+        )
+    assert result._validator_schema.context["spec"] is result
+
+    taxparams.set_state(year=2021)
+    result = pickle.loads(pickle.dumps(taxparams))
+    assert result._state == {"year": 2021}
+    np.testing.assert_equal(result.II_em, taxparams.II_em)
+    for taxparams_ in (result, taxparams):
+        taxparams_.adjust({"II_em": [{"year": 2022, "value": 9000}]})
+    assert result._data == taxparams._data
+
+
+def test_share_baseline(monkeypatch):
+    # Share a new baseline and remove it when the test is done.
+    monkeypatch.setattr(TaxParams, "_baseline", None, raising=False)
+    monkeypatch.setattr(TaxParams, "_shared_baseline", None, raising=False)
+    shared = TaxParams.share_baseline()
+    try:
+        arr, has_year = TaxParams._baseline._stacked_array("STD")
+        assert has_year and not arr.flags.writeable
+        assert np.shares_memory(arr, shared.arrays()["STD"])
+
+        taxparams = TaxParams.from_baseline()
+        np.testing.assert_equal(taxparams.stacked_array("STD"), taxparams.STD)
+        result = pickle.loads(pickle.dumps(taxparams))
+        assert np.shares_memory(
+            result.stacked_array("STD"), shared.arrays()["STD"]
+        )
+        attached = pickle.loads(pickle.dumps(shared))
+        np.testing.assert_equal(attached.arrays()["STD"], arr)
+
+        # A process that is not started by multiprocessing does not unlink
+        # the block when it exits.
+        code = (
+            "import pickle, sys; "
+            "shared = pickle.loads(sys.stdin.buffer.read()); "
+            "print(shared.arrays()['STD'][0, 0])"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            input=pickle.dumps(shared),
+            capture_output=True,
+            check=True,
+        )
+        assert float(out.stdout) == arr[0, 0]
+        attached = pickle.loads(pickle.dumps(shared))
+        np.testing.assert_equal(attached.arrays()["STD"], arr)
+    finally:
+        shared.unlink()
+
+
+def test_cpi_offset_sweep():
+    scenarios = [
+        [{"year": 2020, "value": -0.005}],
+        [{"year": 2014, "value": -0.001}],
+        [{"year": 2018, "value": -0.002}, {"year": 2022, "value": 0.001}],
+    ]
+    taxparams = TaxParams.from_baseline()
+    taxparams.adjust({"CTC_c-indexed": [{"year": 2020, "value": True}]})
+    data = copy.deepcopy(taxparams._data)
+    result = taxparams.cpi_offset_sweep(scenarios)
+    assert taxparams._data == data
+    assert "CTC_c" in result and "SS_Earnings_c" in result
+
+    for n, scenario in enumerate(scenarios):
+        ref = TaxParams.from_baseline()
+        ref.adjust({"CTC_c-indexed": [{"year": 2020, "value": True}]})
+        ref.adjust({"CPI_offset": scenario})
+        for param, arr in result.items():
+            assert arr.shape[0] == len(scenarios)
+            np.testing.assert_equal(arr[n], ref.stacked_array(param))
+
+    with pytest.raises(pt.ValidationError):
+        taxparams.cpi_offset_sweep([[{"year": 2020, "value": 1}]])
+
+
+def test_checkpoint_rollback():
+    taxparams = TaxParams.from_baseline()
+    taxparams.adjust({"II_em": [{"year": 2019, "value": 5000}]})
+    data = copy.deepcopy(taxparams._data)
+    arrays = {param: getattr(taxparams, param) for param in taxparams._data}
+    inflation_rates = taxparams.inflation_rates().copy()
+
+    checkpoint = taxparams.checkpoint()
+    assert checkpoint.changed_params() == []
+    taxparams.adjust(
+        {
+            "CPI_offset": [{"year": 2018, "value": -0.001}],
+            "EITC_c-indexed": [{"year": 2016, "value": False}],
+        }
+    )
+    assert taxparams._data != data
+    changed = checkpoint.changed_params()
+    assert "EITC_c" in changed and "II_em" in changed
+    assert len(changed) < len(taxparams._data)
+    taxparams.rollback(checkpoint)
+    assert taxparams._data == data
+    np.testing.assert_equal(taxparams.inflation_rates(), inflation_rates)
+    for param, arr in arrays.items():
+        np.testing.assert_equal(getattr(taxparams, param), arr)
+
+    # A checkpoint can be rolled back to more than once and the attributes
+    # are rebuilt for the current state.
+    taxparams.adjust({"STD": [{"MARS": "single", "year": 2020, "value": 1}]})
+    taxparams.set_state(year=2020)
+    taxparams.rollback(checkpoint)
+    assert taxparams._data == data
+    np.testing.assert_equal(taxparams.STD, arrays["STD"][2020 - 2013: 2021 - 2013])
+
+    with pytest.raises(ValueError):
+        TaxParams.from_baseline().rollback(checkpoint)
+
+
+def test_checkpoint_without_rates():
+    # The rates of an instance are computed when they are first needed.
+    taxparams = TaxParams.from_baseline()
+    taxparams._inflation_rates = None
+    taxparams._wage_growth_rates = None
+    data = copy.deepcopy(taxparams._data)
+    checkpoint = taxparams.checkpoint()
+    assert checkpoint.inflation_rates is None
+
+    taxparams.adjust({"CPI_offset": [{"year": 2020, "value": -0.005}]})
+    assert taxparams.inflation_rates()
+    taxparams.rollback(checkpoint)
+    assert taxparams._data == data
+    assert taxparams.inflation_rates() == []
+    assert taxparams.wage_growth_rates() == []
+
+    # The rates are computed again when they are needed.
+    ref = TaxParams.from_baseline()
+    for tp in (taxparams, ref):
+        tp.adjust({"CPI_offset": [{"year": 2020, "value": -0.005}]})
+    np.testing.assert_equal(taxparams.inflation_rates(), ref.inflation_rates())
+    np.testing.assert_equal(taxparams.II_em, ref.II_em)
+
+
+def test_fast_defaults(monkeypatch):
+    fast = TaxParams()
+    monkeypatch.setattr(TaxParams, "fast_defaults", False)
+    slow = TaxParams()
+
+    # Everything that _init_parameters sets instead of ParamTools.
+    assert list(fast._data) == list(slow._data)
+    for param, data in slow._data.items():
+        assert fast._data[param] == data
+        assert all(
+            type(vo["value"]) is type(slow_vo["value"])
+            for vo, slow_vo in zip(fast._data[param]["value"], data["value"])
+        )
+        np.testing.assert_equal(getattr(fast, param), getattr(slow, param))
+    assert fast._state == slow._state
+    assert fast._schema == slow._schema
+    assert fast._stateless_label_grid == slow._stateless_label_grid
+    assert fast.label_grid == slow.label_grid
+    assert list(fast.label_validators) == list(slow.label_validators)
+    assert list(fast._validator_schema.fields) == list(
+        slow._validator_schema.fields
+    )
+    assert list(fast._defaults_schema.fields) == list(slow._defaults_schema.fields)
+    for name in ("array_first", "label_to_extend", "uses_extend_func"):
+        assert getattr(fast, name) == getattr(slow, name)
+    assert fast._warnings == slow._warnings and fast._errors == slow._errors
+    np.testing.assert_equal(fast.inflation_rates(), slow.inflation_rates())
+
+    fast.set_state(year=2025)
+    slow.set_state(year=2025)
+    for param in slow._data:
+        np.testing.assert_equal(getattr(fast, param), getattr(slow, param))
+
+    for taxparams in (fast, slow):
+        taxparams.set_state()
+        taxparams.adjust({"II_em": [{"year": 2020, "value": 9000}]})
+    np.testing.assert_equal(fast.II_em, slow.II_em)
+
+
+@pytest.mark.parametrize(
+    "adjustment",
+    [
+        {"STD": [{"MARS": "single", "year": 2020, "value": 13000}]},
+        {
+            "II_brk1": [{"MARS": "single", "year": 2020, "value": 20000}],
+            "II_brk2": [{"MARS": "single", "year": 2020, "value": 40000}],
+        },
+        # Errors and warnings are reported by the ParamTools validator.
+        {"II_em": [{"year": 2020, "value": -1}]},
+        {"II_brk2": [{"MARS": "single", "year": 2020, "value": 1}]},
+        {"ID_Medical_frt": [{"year": 2020, "value": 0.2}]},
+        {"STD": [{"MARS": "nope", "year": 2020, "value": 13000}]},
+        {"CTC_c": [{"year": 2020, "value": "a"}]},
+    ],
+)
+def test_compiled_validation(monkeypatch, adjustment):
+    def adjust(compiled_validation):
+        monkeypatch.setattr(
+            TaxParams, "compiled_validation", compiled_validation
+        )
+        taxparams = TaxParams.from_baseline()
+        try:
+            taxparams.adjust(copy.deepcopy(adjustment))
+        except pt.ValidationError as e:
+            return str(e)
+        return taxparams
+
+    compiled, slow = adjust(True), adjust(False)
+    if isinstance(slow, str):
+        assert compiled == slow
+        return
+    assert compiled.errors == slow.errors
+    for param in adjustment:
+        assert sorted(
+            compiled._data[param]["value"], key=lambda vo: sorted(vo.items())
+        ) == sorted(slow._data[param]["value"], key=lambda vo: sorted(vo.items()))
+        np.testing.assert_equal(getattr(compiled, param), getattr(slow, param))
+
+
+def test_compiled_validation_large():
+    taxparams = TaxParams.from_baseline()
+    adjustment = {
+        param: [vo for vo in data["value"] if vo["year"] >= 2020]
+        for param, data in taxparams._data.items()
+        if param != "CPI_offset"
+    }
+    parsed = taxparams._validator_schema._load(taxparams, adjustment)
+    assert parsed == taxparams._validator_schema._schema.load(adjustment, False)
+
+
+@pytest.mark.parametrize("fast_defaults", [True, False])
+def test_value_store(monkeypatch, fast_defaults):
+    monkeypatch.setattr(TaxParams, "fast_defaults", fast_defaults)
+    taxparams = TaxParams()
+    taxparams.adjust({"STD": [{"MARS": "single", "year": 2020, "value": 13000}]})
+    data = {param: data["value"] for param, data in taxparams._data.items()}
+    data["mixed"] = [{"year": 2020, "value": 1}, {"year": 2021, "value": 1.5}]
+    data["unknown_label"] = [{"year": 1900, "value": 1.0}]
+    store = ValueStore.from_data(data, taxparams._stateless_label_grid)
+
+    assert len(store) == len(data)
+    for param, vos in data.items():
+        result = store[param]
+        assert result == vos
+        assert all(
+            list(vo) == list(res_vo) and type(vo["value"]) is type(res_vo["value"])
+            for vo, res_vo in zip(vos, result)
+        )
+        # New dicts are returned on each call.
+        assert all(vo is not res_vo for vo, res_vo in zip(vos, result))
+    assert store.nbytes < sum(len(vos) for vos in data.values()) * 16
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_adjust_many(workers):
+    reforms = [
+        {"II_em": [{"year": 2020, "value": 9000}]},
+        {"II_em": [{"year": 2020, "value": -1}]},
+        {
+            "CPI_offset": [{"year": 2020, "value": -0.005}],
+            "CTC_c-indexed": [{"year": 2020, "value": True}],
+        },
+    ]
+    results = TaxParams.adjust_many(reforms, workers=workers)
+    assert isinstance(results[1], pt.ValidationError)
+    assert "II_em" in results[1].messages["errors"]
+    for reform, taxparams in zip(reforms[::2], results[::2]):
+        ref = TaxParams()
+        ref.adjust(reform)
+        assert taxparams._data == ref._data
+        np.testing.assert_equal(
+            taxparams.inflation_rates(), ref.inflation_rates()
+        )
+        for param in ref._data:
+            np.testing.assert_equal(getattr(taxparams, param), getattr(ref, param))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_adjust_many_bad_reforms(workers):
+    good = {"II_em": [{"year": 2020, "value": 9000}]}
+    reforms = [
+        [1, 2],
+        good,
+        "x",
+        {"II_em-indexed": 5},
+        {"FOO-indexed": True},
+        {"II_em-indexed": [{"year": 2020}]},
+        "/etc/passwd",
+        {"II_em": [9000]},
+        {"II_em": {"year": 2020, "value": 9000}},
+        {"II_em": [{"year": 2020, "value": 1, "MARS": "single"}]},
+        {"II_em": [{"year": 2020}]},
+        {"CPI_offset": 0.001},
+        {"CPI_offset": [{"year": 2020}]},
+        good,
+    ]
+    results = TaxParams.adjust_many(reforms, workers=workers)
+    errors = [
+        list(result.messages["errors"])
+        for result in results
+        if isinstance(result, pt.ValidationError)
+    ]
+    assert errors == [
+        ["reform"],
+        ["reform"],
+        ["II_em-indexed"],
+        ["FOO-indexed"],
+        ["II_em-indexed"],
+        ["reform"],
+        ["II_em"],
+        ["II_em"],
+        ["II_em"],
+        ["II_em"],
+        ["CPI_offset"],
+        ["CPI_offset"],
+    ]
+    ref = TaxParams()
+    ref.adjust(good)
+    for taxparams in (results[1], results[13]):
+        np.testing.assert_equal(taxparams.II_em, ref.II_em)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_adjust_many_unexpected_error(workers, monkeypatch):
+    def adjust(self, params_or_path, **kwargs):
+        raise AttributeError("not a reform error")
+
+    monkeypatch.setattr(TaxParams, "adjust", adjust)
+    with pytest.raises(AttributeError):
+        TaxParams.adjust_many(
+            [{"II_em": [{"year": 2020, "value": 9000}]}], workers=workers
+        )
+
+
+def test_cli(tmp_path):
+    reforms = tmp_path / "reforms.jsonl"
+    reforms.write_text(
+        '{"II_em": [{"year": 2020, "value": 9000}]}\n'
+        "\n"
+        "not json\n"
+        '{"II_em": [{"year": 2020, "value": -1}]}\n'
+    )
+    output = tmp_path / "output.jsonl"
+    cli.main([str(reforms), "-o", str(output), "--workers", "1"])
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [result["line"] for result in results] == [1, 3, 4]
+    ref = TaxParams()
+    ref.adjust({"II_em": [{"year": 2020, "value": 9000}]})
+    assert list(results[0]["params"]) == ["II_em"]
+    np.testing.assert_equal(results[0]["params"]["II_em"], ref.II_em)
+    assert "reform" in results[1]["errors"]
+    assert "II_em" in results[2]["errors"]
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_cli_bad_reforms(tmp_path, workers):
+    good = '{"II_em": [{"year": 2020, "value": 9000}]}\n'
+    # Lines are never read as file paths.
+    path = tmp_path / "reform.json"
+    path.write_text(good)
+    reforms = tmp_path / "reforms.jsonl"
+    reforms.write_text(
+        "[1, 2]\n"
+        + good
+        + '"x"\n'
+        + '{"II_em-indexed": 5}\n'
+        + '{"FOO-indexed": true}\n'
+        + good
+        + f"{path}\n"
+        + json.dumps(str(path))
+        + "\n"
+        + '{"II_em": [{"year": 2020, "value": 1, "MARS": "single"}]}\n'
+        + '{"II_em": [{"year": 2020}]}\n'
+        + '{"CPI_offset": 0.001}\n'
+        + '{"CPI_offset": [{"year": 2020}]}\n'
+        + good
+    )
+    output = tmp_path / "output.jsonl"
+    cli.main([str(reforms), "-o", str(output), "--workers", workers])
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [result["line"] for result in results] == list(range(1, 14))
+    assert [list(result.get("errors", [])) for result in results] == [
+        ["reform"],
+        [],
+        ["reform"],
+        ["II_em-indexed"],
+        ["FOO-indexed"],
+        [],
+        ["reform"],
+        ["reform"],
+        ["II_em"],
+        ["II_em"],
+        ["CPI_offset"],
+        ["CPI_offset"],
+        [],
+    ]
+    ref = TaxParams()
+    ref.adjust({"II_em": [{"year": 2020, "value": 9000}]})
+    for result in (results[1], results[5], results[12]):
+        np.testing.assert_equal(result["params"]["II_em"], ref.II_em)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_iter_adjust_errors(workers):
+    # ValidationErrors are passed through in order without being adjusted,
+    # and reforms are only read max_pending ahead of the results.
+    read = []
+
+    def reforms():
+        for i in range(20):
+            read.append(i)
+            yield pt.ValidationError({"errors": {"reform": [str(i)]}}, None)
+
+    results = iter_adjust(TaxParams, reforms(), workers=workers, max_pending=2)
+    for i, result in enumerate(results):
+        assert result.messages["errors"]["reform"] == [str(i)]
+        assert len(read) <= i + 3
+    assert len(read) == 20
+
+
+def test_server():
+    reform = {"II_em": [{"year": 2020, "value": 9000}]}
+
+    async def request(port, method, target, body=b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            f"{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode()
+            + body
+        )
+        response = await reader.read()
+        writer.close()
+        head, _, data = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(data)
+
+    async def run():
+        async with server.ReformServer(workers=2) as reform_server:
+            results = await asyncio.gather(
+                *(reform_server.adjust(reform) for _ in range(5))
+            )
+            assert all(result == results[0] for result in results)
+            assert reform_server.metrics.coalesced >= 1
+
+            http_server = await reform_server.serve(port=0)
+            port = http_server.sockets[0].getsockname()[1]
+            status, response = await request(
+                port, "POST", "/adjust", json.dumps(reform).encode()
+            )
+            assert status == 200
+            assert response["params"] == results[0]
+            status, response = await request(
+                port,
+                "POST",
+                "/adjust",
+                b'{"II_em": [{"year": 2020, "value": -1}]}',
+            )
+            assert status == 400
+            assert "II_em" in response["errors"]
+            status, response = await request(port, "POST", "/adjust", b"{")
+            assert status == 400
+            assert "reform" in response["errors"]
+            status, metrics = await request(port, "GET", "/metrics")
+            assert status == 200
+            assert metrics["requests"] == 7
+            assert metrics["invalid"] == 1
+            assert metrics["in_flight"] == 0
+            assert metrics["latency"]["count"] == 7
+
+            # Malformed reforms are client errors.
+            for body in (
+                b'{"II_em-indexed": 5}',
+                b'{"FOO-indexed": true}',
+                b'{"II_em": [{"year": 2020, "value": 1, "MARS": "single"}]}',
+                b'{"II_em": [{"year": 2020}]}',
+                b'{"CPI_offset": 0.001}',
+                b'{"CPI_offset": [{"year": 2020}]}',
+            ):
+                status, response = await request(port, "POST", "/adjust", body)
+                assert status == 400
+                assert list(response["errors"]) == [json.loads(body).popitem()[0]]
+            assert reform_server.metrics.failed == 0
+            reform_server.max_body_size = 10
+            status, response = await request(
+                port, "POST", "/adjust", json.dumps(reform).encode()
+            )
+            assert status == 413
+            reform_server.max_body_size = server.MAX_BODY_SIZE
+
+            # The pool is replaced after a worker dies.
+            executor = reform_server._executor
+            with pytest.raises(BrokenProcessPool):
+                await asyncio.wrap_future(executor.submit(os._exit, 1))
+            status, response = await request(
+                port, "POST", "/adjust", json.dumps(reform).encode()
+            )
+            assert status == 200 and response["params"] == results[0]
+            assert reform_server.metrics.restarts == 1
+            assert reform_server._executor is not executor
+            status, _ = await request(port, "GET", "/health")
+            assert status == 200
+            http_server.close()
+            await http_server.wait_closed()
+        return results[0]
+
+    ref = TaxParams()
+    ref.adjust(reform)
+    params = asyncio.run(run())
+    assert list(params) == ["II_em"]
+    np.testing.assert_equal(params["II_em"], ref.II_em)
+
+
+def test_adjust_stats(taxparams):
+    taxparams.adjust({"II_em": [{"year": 2020, "value": 9000}]})
+    assert taxparams.adjust_stats is None
+
+    collected = []
+    taxparams.adjust_stats_callbacks = (collected.append,)
+    taxparams.adjust(
+        {
+            "CPI_offset": [{"year": 2020, "value": -0.005}],
+            "CTC_c-indexed": [{"year": 2020, "value": True}],
+        }
+    )
+    stats = taxparams.adjust_stats
+    assert collected == [stats]
+    assert list(stats.phases) == [
+        "read_params", "cpi_offset", "indexed", "set_state", "adjust"
+    ]
+    assert stats.total >= sum(stats.phases.values())
+    # The calls that extend and _reextend make are counted, too.
+    assert stats.extend_calls >= 2
+    assert stats.adjust_calls >= stats.extend_calls + 2
+    assert stats.params_reset > 1
+    assert stats.value_objects > 0
+    assert stats.error is None
+
+    with pytest.raises(pt.ValidationError):
+        taxparams.adjust({"II_em": [{"year": 2020, "value": -1}]})
+    assert collected[-1].error == "ValidationError"
+    assert json.loads(json.dumps(collected[-1].to_dict()))
+
+
+def test_adjust_stats_callback_errors(taxparams):
+    def fail(stats):
+        raise RuntimeError("callback failed")
+
+    collected = []
+    taxparams.adjust_stats_callbacks = (fail, collected.append)
+    # The callback's exception is raised after all callbacks have been
+    # called.
+    with pytest.raises(RuntimeError):
+        taxparams.adjust({"II_em": [{"year": 2020, "value": 9000}]})
+    assert collected[-1].error is None
+    # An exception from adjust is not replaced by one from a callback.
+    with pytest.raises(pt.ValidationError):
+        taxparams.adjust({"II_em": [{"year": 2020, "value": -1}]})
+    assert collected[-1].error == "ValidationError"
+    assert len(collected) == 2
+
+
+def test_reextend(taxparams):
+    cuts = {
+        "II_em": 2016,
+        "STD": 2020,
+        "II_brk6": 2018,
+        "II_brk7": 2018,
+        "PT_brk7": 2018,
+    }
+    ref = taxparams.fork()
+    for tp in (taxparams, ref):
+        tp.array_first = False
+        tp.label_to_extend = None
+        tp.set_rates()
+        tp._inflation_rates[5:] += 0.01
+    modified = taxparams._reextend(cuts)
+    ref._delete_after(cuts)
+    ref.extend(label_to_extend="year")
+    for tp in (taxparams, ref):
+        tp.array_first = True
+        tp.label_to_extend = "year"
+        tp.set_state()
+    for param in ref._data:
+        np.testing.assert_equal(getattr(taxparams, param), getattr(ref, param))
+    # The values of II_brk7 and PT_brk7 are not changed, but II_brk7 is
+    # validated against II_brk6 again.
+    assert set(modified) == set(cuts) - {"PT_brk7"}
+    # Values that do not change are not written again.
+    assert taxparams._reextend(cuts) == []
+
+
+def test_lazy_arrays(taxparams):
+    lazy = taxparams.fork()
+    lazy.lazy_arrays = True
+    lazy.set_state()
+    assert "II_em" not in vars(lazy)
+    np.testing.assert_equal(lazy.II_em, taxparams.II_em)
+    assert "II_em" in vars(lazy)
+
+    reform = {
+        "EITC_c": [{"year": 2020, "EIC": "1kid", "value": 10001}],
+        "II_em-indexed": [{"year": 2018, "value": False}],
+    }
+    lazy.STD
+    for tp in (lazy, taxparams):
+        tp.adjust(reform)
+    # Only the attributes of the adjusted parameters are deleted.
+    assert "II_em" not in vars(lazy)
+    assert "STD" in vars(lazy)
+    for param in taxparams._data:
+        np.testing.assert_equal(getattr(lazy, param), getattr(taxparams, param))
+
+    for tp in (lazy, taxparams):
+        tp.set_state(year=2021)
+    assert "STD" not in vars(lazy)
+    for param in taxparams._data:
+        np.testing.assert_equal(getattr(lazy, param), getattr(taxparams, param))
+    with pytest.raises(pt.ValidationError):
+        lazy.set_state(year=2050)
+    with pytest.raises(AttributeError):
+        lazy.not_a_param
+
+
+def test_year_views(taxparams):
+    taxparams.adjust({"EITC_c": [{"year": 2020, "EIC": "1kid", "value": 10001}]})
+    fork = taxparams.fork()
+    for view in taxparams.iter_years():
+        fork.set_state(year=view.year)
+        for param in fork._data:
+            np.testing.assert_equal(view[param], getattr(fork, param))
+    view = taxparams.year_view(2020)
+    assert np.shares_memory(view.II_em, taxparams.stacked_array("II_em"))
+    assert not view.II_em.flags.writeable
+    assert view.EITC_c[0, 1] == 10001
+
+    # Views reflect later adjustments and forks share unchanged arrays.
+    fork = taxparams.fork()
+    taxparams.adjust({"EITC_c": [{"year": 2020, "EIC": "1kid", "value": 10}]})
+    assert view.EITC_c[0, 1] == 10
+    assert fork.stacked_array("II_em") is taxparams.stacked_array("II_em")
+    assert fork.stacked_array("EITC_c")[7, 1] == 10001
+
+
+def test_to_policy_arrays(taxparams):
+    taxparams.adjust(
+        {
+            "CPI_offset": [{"year": 2020, "value": -0.005}],
+            "EITC_c": [{"year": 2020, "EIC": "1kid", "value": 10001}],
+        }
+    )
+    arrays = taxparams.to_policy_arrays()
+    assert list(arrays) == list(taxparams._data)
+    taxparams.set_state()
+    for param in taxparams._data:
+        np.testing.assert_equal(arrays[param], getattr(taxparams, param))
+        assert arrays[param].dtype == getattr(taxparams, param).dtype
+    assert arrays["EITC_c"] is taxparams.stacked_array("EITC_c")
+    assert list(taxparams.to_policy_arrays(["II_em"])) == ["II_em"]
+
+
+def test_to_policy_arrays_deleted(taxparams):
+    min_year = min(taxparams._stateless_label_grid["year"])
+    taxparams._delete_after({"II_em": min_year - 1, "EITC_c": min_year - 1})
+    assert taxparams._data["II_em"]["value"] == []
+    arrays = taxparams.to_policy_arrays()
+    assert arrays["II_em"].size == 0
+    assert arrays["EITC_c"].size == 0
+
+
+def test_results_file(tmp_path):
+    reforms = {
+        "ctc": {"CTC_c-indexed": [{"year": 2020, "value": True}]},
+        "cpi": {"CPI_offset": [{"year": 2020, "value": -0.005}]},
+    }
+    results = []
+    for reform in reforms.values():
+        taxparams = TaxParams.from_baseline()
+        taxparams.adjust(reform)
+        results.append(taxparams)
+    path = tmp_path / "results.tpr"
+    save_results(path, results, names=list(reforms))
+
+    result_file = ResultFile(path)
+    assert len(result_file) == 2
+    assert result_file.values("II_em").shape[0] == 2
+    for name, taxparams, stored in zip(reforms, results, result_file):
+        assert stored.name == name
+        taxparams.set_state()
+        for param in taxparams._data:
+            np.testing.assert_equal(
+                getattr(stored, param), getattr(taxparams, param)
+            )
+            assert stored._data[param]["indexed"] == taxparams._data[
+                param
+            ].get("indexed", False)
+        np.testing.assert_equal(
+            stored.inflation_rates(), taxparams.inflation_rates()
+        )
+        np.testing.assert_equal(
+            stored.year_view(2025).EITC_c, taxparams.year_view(2025).EITC_c
+        )
+    stored = result_file["cpi"]
+    assert not stored.II_em.flags.writeable
+    assert isinstance(result_file.values("II_em").base, np.memmap)
+    assert np.shares_memory(
+        stored.to_policy_arrays(["II_em"])["II_em"], result_file.values("II_em")
+    )
+
+    bad = tmp_path / "bad.tpr"
+    bad.write_bytes(b"not a result file" * 4)
+    with pytest.raises(ValueError):
+        ResultFile(bad)
+
+
+def test_baseline_delta():
+    reform = {
+        "CPI_offset": [{"year": 2020, "value": -0.005}],
+        "EITC_c-indexed": [{"year": 2018, "value": False}],
+        "STD": [{"year": 2019, "MARS": "single", "value": 9000}],
+    }
+    taxparams = TaxParams.from_baseline()
+    taxparams.adjust(reform)
+    delta = taxparams.to_delta()
+    assert isinstance(delta, BaselineDelta)
+    assert set(delta.changed_params()) <= set(
+        taxparams._diff_params(TaxParams._baseline)
+    )
+    assert "STD" in delta.changed_params()
+
+    taxparams.set_state()
+    for param in taxparams._data:
+        np.testing.assert_equal(getattr(delta, param), getattr(taxparams, param))
+        assert delta._data[param]["indexed"] == taxparams._data[param].get(
+            "indexed", False
+        )
+    np.testing.assert_equal(delta.inflation_rates(), taxparams.inflation_rates())
+    assert delta.diff(taxparams) == {}
+
+    restored = delta.to_taxparams()
+    restored.set_state(year=2025)
+    taxparams.set_state(year=2025)
+    for param in taxparams._data:
+        np.testing.assert_equal(getattr(restored, param), getattr(taxparams, param))
+
+    # Adjusting a delta only keeps the cells that differ from the baseline.
+    other = TaxParams.from_baseline().to_delta()
+    assert other.changed_params() == [] and other.nbytes == 0
+    other.adjust({"II_em": [{"year": 2021, "value": 5000}]})
+    (index,), values, base_values = other.diff(TaxParams.from_baseline())["II_em"]
+    assert values[0] == 5000
+    assert other.changed_params() == ["II_em"] and other.nbytes < 1000
+    nbytes = other.nbytes
+    np.testing.assert_equal(
+        base_values, TaxParams._baseline.stacked_array("II_em")[index]
+    )
+    other.adjust({"FICA_ss_trt": [{"year": 2021, "value": 0.13}]})
+    assert other.changed_params() == ["FICA_ss_trt", "II_em"]
+    other.adjust(
+        {
+            "FICA_ss_trt": [{"year": 2021, "value": 0.124}],
+            "II_em": [{"year": 2021, "value": base_values[0].item()}],
+        }
+    )
+    assert other.changed_params() == ["II_em"]
+    assert other.nbytes < nbytes
+
+
+def test_to_policy_arrays_policy(taxparams):
+    taxparams.adjust(
+        {
+            "CPI_offset": [{"year": 2020, "value": -0.005}],
+            "CTC_c-indexed": [{"year": 2020, "value": True}],
+        }
+    )
+    pol = taxcalc.Policy()
+    taxparams.to_policy_arrays(policy=pol)
+    assert pol._vals["_CTC_c"]["indexed"]
+    cmp_with_taxcalc_values(taxparams, pol)
+
+    ref = taxcalc.Policy()
+    ref.implement_reform(
+        {"CPI_offset": {2020: -0.005}, "CTC_c-indexed": {2020: True}}
+    )
+    np.testing.assert_allclose(pol._inflation_rates, ref._inflation_rates)
+    pol.set_year(2025)
+    ref.set_year(2025)
+    np.testing.assert_allclose(pol.CTC_c, ref.CTC_c)
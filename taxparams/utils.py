@@ -1,15 +1,28 @@
 from collections import defaultdict
+import functools
 import os
-import inspect
 import json
+import hashlib
+import itertools
+import math
+import re
+import importlib.util
+import importlib.metadata
+import tempfile
+import threading
+import zipfile
 
-import taxcalc
-import paramtools
+import numpy as np
 
-TCPATH = inspect.getfile(taxcalc.Policy)
-TCDIR = os.path.dirname(TCPATH)
-with open(os.path.join(TCDIR, "policy_current_law.json")) as f:
-    DEFAULTS = json.loads(f.read())
+
+# Directory of the converted defaults cache. The cache is off unless the
+# TAXPARAMS_CACHE_DIR environment variable is set.
+CACHE_DIR = os.environ.get("TAXPARAMS_CACHE_DIR", "")
+
+RATES_CACHE_SIZE = 128
+
+_gfactors = None
+_gfactors_lock = threading.Lock()
 
 
 POLICY_SCHEMA = {
@@ -47,8 +60,60 @@ POLICY_SCHEMA = {
     }
 }
 
+
+def taxcalc_dir():
+    """
+    Directory of the installed taxcalc package. It is located without
+    importing taxcalc.
+    """
+    spec = importlib.util.find_spec("taxcalc")
+    if spec is None:
+        raise ImportError("taxcalc is not installed.")
+    return list(spec.submodule_search_locations)[0]
+
+
+def taxcalc_version():
+    """
+    Version of the installed taxcalc package. taxcalc is only imported if
+    the version is not available from the package metadata.
+    """
+    try:
+        return importlib.metadata.version("taxcalc")
+    except importlib.metadata.PackageNotFoundError:
+        import taxcalc
+
+        return taxcalc.__version__
+
+
+def __getattr__(name):
+    """
+    Resolve the taxcalc paths and policy_current_law.json data on first
+    access so that importing this module does not import taxcalc.
+    """
+    # Functions in this module call __getattr__ directly.
+    if name in globals():
+        return globals()[name]
+    if name == "TCDIR":
+        value = taxcalc_dir()
+    elif name == "TCPATH":
+        value = os.path.join(taxcalc_dir(), "policy.py")
+    elif name == "DEFAULTS_PATH":
+        value = os.path.join(taxcalc_dir(), "policy_current_law.json")
+    elif name == "DEFAULTS":
+        with open(__getattr__("DEFAULTS_PATH")) as f:
+            value = json.loads(f.read())
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+# NumPy types that ParamTools deserializes values of each parameter type to.
+VALUE_TYPES = {"float": np.float64, "int": np.int64, "bool": np.bool_}
+
+
 def convert_defaults():
-    pcl = DEFAULTS
+    pcl = __getattr__("DEFAULTS")
     type_map = {
         "real": "float",
         "boolean": "bool",
@@ -59,25 +124,7 @@ def convert_defaults():
     new_pcl = defaultdict(dict)
     new_pcl["schema"] = POLICY_SCHEMA
     for param, item in pcl.items():
-        values = []
-        pol_val = item["value"]
-        min_year = min(item["value_yrs"])
-        if isinstance(pol_val[0], list):
-            for year in range(len(pol_val)):
-                for dim1 in range(len(pol_val[0])):
-                    values.append({
-                        "year": min_year + year,
-                        item["vi_name"]: item["vi_vals"][dim1],
-                        "value": pol_val[year][dim1],
-                    })
-        else:
-            for year in range(len(pol_val)):
-                values.append({
-                    "year": min_year + year,
-                    "value": pol_val[year],
-                })
-
-        new_pcl[param]['value'] = values
+        new_pcl[param]['value'] = default_value_objects(item)
         new_pcl[param]['title'] = pcl[param]["long_name"]
         new_pcl[param]['type'] = type_map[pcl[param]["value_type"]]
 
@@ -93,3 +140,249 @@ def convert_defaults():
                 new_pcl[param][k] = pcl[param][k]
 
     return new_pcl
+
+
+def default_value_objects(item):
+    """
+    Convert the value array of a policy_current_law.json entry, with one
+    row for each year from the first year in value_yrs and, for parameters
+    with a vi_name, one column for each value in vi_vals, to value objects.
+
+    Returns: list of value objects in row-major order.
+    """
+    values = np.array(item["value"], dtype=object)
+    return flat_value_objects(
+        values.ravel().tolist(),
+        values.shape,
+        min(item["value_yrs"]),
+        item.get("vi_name"),
+        item.get("vi_vals"),
+    )
+
+
+def flat_value_objects(values, shape, first_year, vi_name=None, vi_vals=None):
+    """
+    Convert the flattened values of an array with one row for each year
+    from first_year and, if shape has two dimensions, one column for each
+    value of the vi_name label in vi_vals, to value objects.
+
+    Returns: list of value objects in row-major order.
+    """
+    years = range(first_year, first_year + shape[0])
+    if len(shape) == 2:
+        vi_vals = vi_vals[: shape[1]]
+        return [
+            {"year": year, vi_name: vi_val, "value": value}
+            for (year, vi_val), value in zip(
+                itertools.product(years, vi_vals), values
+            )
+        ]
+    return [
+        {"year": year, "value": value} for year, value in zip(years, values)
+    ]
+
+
+def typed_value_objects(vos, value_type):
+    """
+    Cast the values of a parameter's value objects to the types that
+    ParamTools deserializes them to, all at once with NumPy.
+
+    Returns: list of new value objects.
+    """
+    if value_type not in VALUE_TYPES or not vos:
+        return [dict(vo) for vo in vos]
+    values = np.array(
+        [vo["value"] for vo in vos], dtype=VALUE_TYPES[value_type]
+    )
+    return [dict(vo, value=value) for vo, value in zip(vos, values)]
+
+
+def defaults_cache_key():
+    """
+    Key for the converted defaults cache: a hash of the taxcalc version,
+    POLICY_SCHEMA, and the contents of policy_current_law.json and of this
+    module. Any edit to these files changes the key, even one that keeps
+    their size and modification time.
+    """
+    h = hashlib.sha256()
+    h.update(taxcalc_version().encode())
+    for path in (__getattr__("DEFAULTS_PATH"), __file__):
+        with open(path, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    h.update(json.dumps(POLICY_SCHEMA, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def defaults_cache_prefix():
+    """
+    Prefix of the names of the cache files for the installed taxcalc
+    version. Environments with different taxcalc versions can share a cache
+    directory without removing each other's files.
+    """
+    version = re.sub(r"[^A-Za-z0-9._]", "_", taxcalc_version())
+    return f"defaults-{version}-"
+
+
+def write_defaults_cache(f, defaults):
+    """
+    Write the converted defaults to f in array form: the value array of
+    each parameter in policy_current_law.json, concatenated with the arrays
+    of the same kind, and the rest of the defaults as JSON. Parameters whose
+    values do not fit in a typed array keep their value objects in the JSON.
+    """
+    pcl = __getattr__("DEFAULTS")
+    metadata = {}
+    layout = {}
+    arrays = defaultdict(list)
+    sizes = defaultdict(int)
+    for param, data in defaults.items():
+        metadata[param] = data
+        if param not in pcl:
+            continue
+        values = np.array(pcl[param]["value"])
+        if values.dtype.kind not in "biufU":
+            continue
+        kind = values.dtype.kind
+        layout[param] = [
+            kind,
+            sizes[kind],
+            list(values.shape),
+            min(pcl[param]["value_yrs"]),
+            pcl[param].get("vi_name"),
+            pcl[param].get("vi_vals"),
+        ]
+        arrays[kind].append(values.ravel())
+        sizes[kind] += values.size
+        # The value objects are rebuilt from the arrays.
+        metadata[param] = dict(data, value=None)
+    metadata = json.dumps({"defaults": metadata, "layout": layout}).encode()
+    np.savez(
+        f,
+        metadata=np.frombuffer(metadata, dtype=np.uint8),
+        **{kind: np.concatenate(values) for kind, values in arrays.items()},
+    )
+
+
+def read_defaults_cache(f):
+    """
+    Read converted defaults written by write_defaults_cache. Pickled objects
+    are not loaded, so reading a file that someone else wrote to the cache
+    directory can not run code.
+
+    Returns: converted defaults.
+    """
+    with np.load(f, allow_pickle=False) as cache:
+        stored = json.loads(cache["metadata"].tobytes())
+        # Values are sliced from lists since most parameters have a handful
+        # of values.
+        columns = {
+            kind: cache[kind].tolist()
+            for kind in cache.files
+            if kind != "metadata"
+        }
+    defaults = stored["defaults"]
+    for param, (kind, offset, shape, first_year, vi_name, vi_vals) in (
+        stored["layout"].items()
+    ):
+        values = columns[kind][offset : offset + math.prod(shape)]
+        defaults[param]["value"] = flat_value_objects(
+            values, shape, first_year, vi_name, vi_vals
+        )
+    return defaults
+
+
+def load_defaults(cache_dir=None):
+    """
+    Load the converted defaults from the on-disk cache, see
+    write_defaults_cache. If the cache is missing, stale, or unreadable,
+    the defaults are converted with convert_defaults and the cache is
+    re-written.
+
+    The cache is only used if cache_dir is set or if the TAXPARAMS_CACHE_DIR
+    environment variable is set to the directory to store it in.
+
+    Returns: converted defaults.
+    """
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        return convert_defaults()
+    prefix = defaults_cache_prefix()
+    fname = f"{prefix}{defaults_cache_key()}.npz"
+    path = os.path.join(cache_dir, fname)
+    try:
+        return read_defaults_cache(path)
+    except (
+        OSError,
+        ValueError,
+        KeyError,
+        TypeError,
+        IndexError,
+        zipfile.BadZipFile,
+    ):
+        # Missing or corrupted cache file. Fall through and rebuild it.
+        pass
+
+    defaults = convert_defaults()
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so that concurrent readers never
+        # see a partially written cache.
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            write_defaults_cache(f, defaults)
+        os.replace(tmp_path, path)
+        tmp_path = None
+        # Only remove the stale files of the same taxcalc version.
+        for other in os.listdir(cache_dir):
+            if other.startswith(prefix) and other != fname:
+                os.remove(os.path.join(cache_dir, other))
+    except (OSError, TypeError, ValueError):
+        pass
+    finally:
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    return defaults
+
+
+def growfactors():
+    """
+    Return the taxcalc.GrowFactors instance that is shared by all TaxParams
+    instances in this process. The growth factors file is read once.
+    """
+    global _gfactors
+    if _gfactors is None:
+        with _gfactors_lock:
+            if _gfactors is None:
+                import taxcalc
+
+                _gfactors = taxcalc.GrowFactors()
+    return _gfactors
+
+
+@functools.lru_cache(maxsize=RATES_CACHE_SIZE)
+def index_rates(cpi_offset, start_year=2013, end_year=2030):
+    """
+    Compute the price inflation and wage growth rates used for indexing.
+    Results are cached by the CPI_offset values, a tuple with one value
+    for each year from start_year to end_year.
+
+    The returned arrays are shared between callers and are read-only.
+
+    Returns: inflation rates, wage growth rates
+    """
+    gfactors = growfactors()
+    inflation_rates = np.round(
+        np.array(gfactors.price_inflation_rates(start_year, end_year))
+        + np.array(cpi_offset),
+        4,
+    )
+    wage_growth_rates = np.array(
+        gfactors.wage_growth_rates(start_year, end_year)
+    )
+    inflation_rates.flags.writeable = False
+    wage_growth_rates.flags.writeable = False
+    return inflation_rates, wage_growth_rates
@@ -0,0 +1,254 @@
+import copy
+import numbers
+
+import numpy as np
+
+
+class Fallback(Exception):
+    """
+    Raised when an adjustment can not be validated by CompiledValidator.
+    """
+
+
+# Python and NumPy types that are accepted for each parameter type and the
+# type that ParamTools deserializes them to.
+VALUE_TYPES = {
+    "float": ((numbers.Real,), np.float64),
+    "int": ((numbers.Integral,), np.int64),
+    "bool": ((bool, np.bool_), np.bool_),
+}
+
+
+class CompiledValidator:
+    """
+    Wrapper around the ParamTools validator schema of a TaxParams instance
+    that validates adjustments with vectorized NumPy checks instead of one
+    value object at a time:
+
+    - Label values are checked against the choices or the range of the
+        label validators in POLICY_SCHEMA.
+    - Values are checked against the type of the parameter.
+    - Values are compared to the minimum and maximum of the parameter's
+        range validator. Bounds that refer to other parameters are compared
+        with the values of those parameters that have the same labels,
+        taken from the adjustment if they are adjusted too.
+
+    If all checks pass, the adjustment is returned with the same types as
+    ParamTools' validator schema. Otherwise, or if the adjustment uses
+    anything that is not covered by these checks, it is loaded by the
+    ParamTools validator schema, which reports errors and warnings exactly
+    as before.
+
+    Other attributes are those of the ParamTools validator schema.
+    """
+
+    def __init__(self, schema):
+        self._schema = schema
+
+    @property
+    def context(self):
+        return self._schema.context
+
+    @context.setter
+    def context(self, value):
+        self._schema.context = value
+
+    def __getattr__(self, name):
+        return getattr(self._schema, name)
+
+    def __copy__(self):
+        return type(self)(copy.copy(self._schema))
+
+    def load(self, data, ignore_warnings):
+        spec = self.context["spec"]
+        if getattr(spec, "compiled_validation", False):
+            try:
+                return self._load(spec, data)
+            except Fallback:
+                pass
+        return self._schema.load(data, ignore_warnings)
+
+    def _load(self, spec, data):
+        """
+        Returns: deserialized adjustment.
+
+        Raises:
+            Fallback if the adjustment may not be valid or can not be
+                checked.
+        """
+        if not isinstance(data, dict):
+            raise Fallback()
+        columns = {}
+        for param, vos in data.items():
+            if (
+                param not in spec._data
+                or not isinstance(vos, list)
+                or not vos
+                or not all(isinstance(vo, dict) for vo in vos)
+            ):
+                raise Fallback()
+            columns[param] = self._columns(spec, param, vos)
+
+        for param, (labels, label_values, values, present) in columns.items():
+            validators = spec._data[param].get("validators", {})
+            if set(validators) - {"range", "choice"}:
+                raise Fallback()
+            # Value objects without a value delete values and are not checked.
+            if len(present) < len(values):
+                label_values = [
+                    [column[i] for i in present] for column in label_values
+                ]
+            checked = np.array([values[i] for i in present], dtype=values.dtype)
+            if "choice" in validators and not np.isin(
+                checked, validators["choice"]["choices"]
+            ).all():
+                raise Fallback()
+            if "range" in validators:
+                self._check_range(
+                    spec,
+                    data,
+                    param,
+                    validators["range"],
+                    labels,
+                    label_values,
+                    checked,
+                )
+
+        # Parameters are in the order of the validator schema's fields, like
+        # the adjustments that it loads.
+        result = {}
+        for param in [param for param in self._schema.fields if param in columns]:
+            labels, label_values, values, present = columns[param]
+            keys = labels + ("value",)
+            if len(present) < len(values):
+                values = [
+                    value if vo["value"] is not None else None
+                    for vo, value in zip(data[param], values)
+                ]
+            result[param] = [
+                dict(zip(keys, row)) for row in zip(*label_values, values)
+            ]
+        return result
+
+    def _columns(self, spec, param, vos):
+        """
+        Check the labels and the type of the values of a parameter's value
+        objects.
+
+        Returns: (label names, list of label value lists, typed values,
+            indices of the value objects whose value is not None).
+        """
+        keys = set(vos[0])
+        if "value" not in keys or any(vo.keys() != keys for vo in vos):
+            raise Fallback()
+        labels = tuple(label for label in spec.label_validators if label in keys)
+        if len(labels) != len(keys) - 1:
+            raise Fallback()
+
+        label_values = []
+        for label in labels:
+            column = [vo[label] for vo in vos]
+            grid = spec._stateless_label_grid[label]
+            if isinstance(grid[0], str):
+                valid = all(type(value) is str for value in column)
+            else:
+                valid = all(
+                    isinstance(value, numbers.Integral)
+                    and not isinstance(value, (bool, np.bool_))
+                    for value in column
+                )
+                column = [int(value) for value in column]
+            if not valid or not np.isin(column, grid).all():
+                raise Fallback()
+            label_values.append(column)
+
+        value_type = spec._data[param]["type"]
+        if value_type not in VALUE_TYPES:
+            raise Fallback()
+        accepted, np_type = VALUE_TYPES[value_type]
+        column = [vo["value"] for vo in vos]
+        present = [i for i, value in enumerate(column) if value is not None]
+        if len(present) < len(column):
+            # Placeholder for the values that are None. They are put back by
+            # _load.
+            column = [
+                value if value is not None else np_type(0) for value in column
+            ]
+        if not all(
+            isinstance(value, accepted)
+            and (value_type == "bool" or not isinstance(value, (bool, np.bool_)))
+            for value in column
+        ):
+            raise Fallback()
+        try:
+            values = np.array(column, dtype=np_type)
+        except OverflowError:
+            raise Fallback()
+        return labels, label_values, values, present
+
+    def _check_range(
+        self, spec, data, param, range_dict, labels, label_values, values
+    ):
+        """
+        Raises:
+            Fallback if a value is outside of the range, which may be an
+                error or a warning.
+        """
+        for bound, out_of_range in (
+            ("min", np.less),
+            ("max", np.greater),
+        ):
+            op_value = range_dict.get(bound)
+            if op_value is None:
+                continue
+            if op_value == "default" or op_value in spec._data:
+                oth_param = param if op_value == "default" else op_value
+                if op_value != "default" and op_value in data:
+                    oth_vos = data[op_value]
+                else:
+                    oth_vos = spec._data[oth_param]["value"]
+                limits = self._limits(
+                    oth_vos, labels, label_values, np.max if bound == "min" else np.min
+                )
+            elif isinstance(op_value, numbers.Real):
+                limits = np.full(len(values), op_value, dtype=float)
+            else:
+                raise Fallback()
+            with np.errstate(invalid="ignore"):
+                if out_of_range(values, limits).any():
+                    raise Fallback()
+
+    def _limits(self, oth_vos, labels, label_values, reduce):
+        """
+        Find the values of another parameter that each value object is
+        compared with: those with the same values of the value object's
+        labels. They are reduced to the one that is the most restrictive.
+
+        Returns: float array with one limit for each value object. Value
+            objects without values to compare with get NaN, which never
+            fails a comparison.
+        """
+        keys = list(zip(*label_values))
+        # Only the values that are compared with a value object are checked,
+        # so that values that are deleted by the same adjustment are skipped.
+        needed = set(keys)
+        groups = {}
+        try:
+            for vo in oth_vos:
+                key = tuple(vo[label] for label in labels)
+                if key in needed:
+                    groups.setdefault(key, []).append(vo["value"])
+        except KeyError:
+            raise Fallback()
+        reduced = {}
+        for key, group in groups.items():
+            if not all(
+                isinstance(value, numbers.Real)
+                and not isinstance(value, (bool, np.bool_))
+                for value in group
+            ):
+                raise Fallback()
+            reduced[key] = reduce(group)
+        return np.array(
+            [reduced.get(key, np.nan) for key in keys], dtype=float
+        )
@@ -0,0 +1,93 @@
+class YearView:
+    """
+    Read-only view of the parameter values in one year. Parameters are
+    accessed as attributes or items and have the same shape as the
+    attributes of a TaxParams instance after set_state(year=year). The
+    arrays are slices of the instance's year-stacked arrays, so creating a
+    view does not copy any values.
+
+    A view reflects adjustments that are made to the instance after it is
+    created.
+    """
+
+    def __init__(self, taxparams, year):
+        self._taxparams = taxparams
+        self.year = year
+        self._ix = taxparams._stateless_label_grid["year"].index(year)
+
+    def __getitem__(self, param):
+        arr, has_year = self._taxparams._stacked_array(param)
+        if not has_year:
+            return arr
+        return arr[self._ix: self._ix + 1]
+
+    def __getattr__(self, param):
+        if param.startswith("_"):
+            raise AttributeError(param)
+        try:
+            return self[param]
+        except KeyError:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {param!r}"
+            )
+
+    def __iter__(self):
+        return iter(self._taxparams._data)
+
+    def items(self):
+        for param in self:
+            yield param, self[param]
+
+    def __repr__(self):
+        return f"YearView(year={self.year})"
+
+
+class ParamsView:
+    """
+    Base class of read-only objects with the interface of a TaxParams
+    instance for reading parameter values. Parameters are accessed as
+    attributes and have the same values as the attributes of the instance
+    after set_state().
+
+    Subclasses define _stacked_array(param), like
+    TaxParams._stacked_array, _data, a dict of {param: {"indexed": bool}},
+    _stateless_label_grid, inflation_rates, and wage_growth_rates.
+    """
+
+    def stacked_array(self, param):
+        return self._stacked_array(param)[0]
+
+    def __getattr__(self, param):
+        if param.startswith("_"):
+            raise AttributeError(param)
+        try:
+            return self.stacked_array(param)
+        except KeyError:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {param!r}"
+            )
+
+    def year_view(self, year):
+        """
+        Returns: YearView of the parameter values in year.
+        """
+        return YearView(self, year)
+
+    def iter_years(self):
+        """
+        Yield a YearView for each year from start_year to end_year.
+        """
+        for year in self._stateless_label_grid["year"]:
+            yield YearView(self, year)
+
+    def to_policy_arrays(self, params=None, policy=None):
+        """
+        Same as TaxParams.to_policy_arrays.
+        """
+        from taxparams import TaxParams
+
+        params = list(self._data) if params is None else list(params)
+        arrays = {param: self.stacked_array(param) for param in params}
+        if policy is not None:
+            TaxParams._write_policy(self, policy, arrays)
+        return arrays